@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+sklearn's iterative CCA (NIPALS), which map_spaces("cca") used before, and the direct solver of utils.cca
+(in float64 and float32) fitted on the same synthetic correlated views. Prints wall time and peak memory of
+each fit and fails if the dimension-wise correlations of the direct solver deviate from sklearn's
+(the sklearn fit takes minutes with the default settings).
+Run from the project root: python3 -m benchmarks.cca
+"""
+
+import argparse
+import numpy as np
+from sklearn.cross_decomposition import CCA as NIPALSCCA
+from utils.cca import CCA
+from utils.statistics import accumulate
+from benchmarks.timing import measured
+
+
+def correlated_views(n, dim, seed=0):
+    """
+    Two views sharing latent factors of decreasing strength
+    :param n: number of rows (shared words)
+    :param dim: dimension of both views
+    :param seed: random seed
+    :return: X, Y (float32, as the embedding spaces)
+    """
+    rng = np.random.RandomState(seed)
+    latent = rng.randn(n, dim) * np.linspace(1, 0.1, dim)
+    X = latent.dot(rng.randn(dim, dim)) + rng.randn(n, dim)
+    Y = latent.dot(rng.randn(dim, dim)) + rng.randn(n, dim)
+    return X.astype(np.float32), Y.astype(np.float32)
+
+
+def fit_transform(cca, X, Y):
+    cca.fit(X, Y)
+    return cca.transform(X, Y)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare direct and iterative CCA")
+    parser.add_argument('--n', type=int, default=20000, help="number of shared words")
+    parser.add_argument('--dim', type=int, default=100, help="embedding dimension")
+    parser.add_argument('--max_iter', type=int, default=5000, help="maximum number of NIPALS iterations")
+    parser.add_argument('--tol', type=float, default=1e-3, help="tolerance of the correlations")
+    args = parser.parse_args()
+
+    X, Y = correlated_views(args.n, args.dim)
+    results = {}
+    for name, cca in [("sklearn (NIPALS)", NIPALSCCA(n_components=args.dim, max_iter=args.max_iter)),
+                      ("direct", CCA(n_components=args.dim)),
+                      ("direct float32", CCA(n_components=args.dim, dtype=np.float32))]:
+        with measured(trace=True) as record:
+            x_scores, y_scores = fit_transform(cca, X, Y)
+        corr = np.sort(accumulate([x_scores, y_scores]).correlations())[::-1]
+        results[name] = corr
+        print("{:17s} {:8.2f}s {:8.1f} MB peak, CCA measure {:.6f}".format(name, record["seconds"], record["peak_mb"],
+                                                                           np.mean(corr)))
+
+    reference = results["sklearn (NIPALS)"]
+    for name in ("direct", "direct float32"):
+        deviation = np.abs(results[name] - reference).max()
+        assert deviation < args.tol, "{} correlations differ from sklearn by {}".format(name, deviation)
+        print("{}: max deviation of the correlations from sklearn {:.2e}".format(name, deviation))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Blocked nearest neighbour search (utils.neighbours.top_k) on a synthetic space: the neighbours must be those of
+a row-by-row scan (similarities of one word to the whole vocabulary, fully sorted), whose time is extrapolated
+from a sample of words. Also times the neighbourhood overlap of two spaces before and after the neighbours are
+cached in the registry.
+Run from the project root: python3 -m benchmarks.neighbours
+"""
+
+import os
+import argparse
+import tempfile
+import numpy as np
+from utils.neighbours import top_k
+from utils.embeddings import EmbeddingRegistry
+from utils.UniversalityTests import UniversalityTests
+from benchmarks.synthetic import save_synthetic_spaces
+from benchmarks.timing import timed
+
+
+def scan_top_k(vectors, rows, k=10):
+    # one similarity row per word and a full sort of it
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    neighbours = []
+    for row in rows:
+        sims = vectors.dot(vectors[row])
+        sims[row] = -np.inf
+        neighbours.append(np.argsort(-sims)[:k])
+    return np.array(neighbours)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare blocked and row-wise nearest neighbour search")
+    parser.add_argument('--vocab_size', type=int, default=50000, help="number of words per space")
+    parser.add_argument('--dim', type=int, default=100, help="dimension")
+    parser.add_argument('--k', type=int, default=10, help="number of neighbours")
+    parser.add_argument('--sample', type=int, default=1000, help="number of words for the row-wise scan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        src, trg = save_synthetic_spaces(work_dir, vocab_size=args.vocab_size, dim=args.dim)
+        registry = EmbeddingRegistry()
+        vectors = registry.get(src).vectors
+        rows = np.arange(len(vectors))
+
+        neighbours, t_blocked = timed(top_k, vectors, rows, args.k)
+        reference, t_scan = timed(scan_top_k, vectors, rows[:args.sample], args.k)
+        t_scan *= len(rows) / args.sample
+        print("blocked: {:.2f}s for {} words, row-wise scan: {:.2f}s (extrapolated from {} words), speedup {:.1f}x".format(
+            t_blocked, len(rows), t_scan, args.sample, t_scan / t_blocked))
+        # ties aside, both return the same neighbours in the same order
+        agreement = np.mean(neighbours[:args.sample] == reference)
+        assert agreement > 0.999, "neighbours differ from the row-wise scan ({:.4f} agreement)".format(agreement)
+        print("agreement with the row-wise scan: {:.4f}".format(agreement))
+
+        vocab = os.path.join(work_dir, "vocab.txt")
+        embedding_tests = UniversalityTests(src, trg, vocab, registry=registry)
+        overlap, t_first = timed(embedding_tests.get_neighbour_overlap, args.k)
+        _, t_cached = timed(UniversalityTests(src, trg, vocab, registry=registry).get_neighbour_overlap, args.k)
+        print("neighbourhood overlap {:.4f} of {} shared words: {:.2f}s, {:.2f}s with cached neighbours".format(
+            np.mean(overlap), len(overlap), t_first, t_cached))
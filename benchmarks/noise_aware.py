@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+The original row-wise noise aware alignment is kept here as reference: on synthetic pairs with a known portion
+of noisy pairs, the vectorized utils.noise_aware has to find the same transform, alpha and clean/noisy indices
+(hard and soft EM), and the speedup is reported.
+Run from the project root: python3 -m benchmarks.noise_aware
+"""
+
+import argparse
+import numpy as np
+from scipy.linalg import orthogonal_procrustes
+from utils.noise_aware import noise_aware
+from benchmarks.timing import timed
+
+
+def reference_P(Y, dim, mu, s):
+    # original implementation of utils.noise_aware.P
+    C = -dim/2*(np.log(2*np.pi*s))
+    exp = (-.5 * np.einsum('ij, ij -> i',
+        Y - mu, np.dot(np.eye(dim)*(1/s), (Y - mu).T).T))
+    return C + exp
+
+
+def reference_EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
+    # original implementation of utils.noise_aware.EM_aux
+    n, dim = X.shape
+    threshold = 0.00001
+    prev_alpha = -1
+    while abs(alpha - prev_alpha) > threshold:
+        prev_alpha = alpha
+        ws = [0] * n
+        nom = [0] * n
+        sup = [0] * n
+        nom[:] = np.log(alpha) + reference_P(Y, dim, np.dot(X, Q), sigma)
+        sup[:] = np.log((1 - alpha)) + reference_P(Y, dim, muy, sigmay)
+        m = max(nom)
+        ws[:] = np.exp(nom[:] - m) / (np.exp(nom[:] - m) + np.exp(sup[:] - m))
+        ws = np.where(np.isnan(ws), 0, ws)
+        if is_soft:
+            sum_ws = float(sum(ws))
+            alpha = sum_ws / float(n)
+            Q, _ = orthogonal_procrustes(np.multiply(np.array(ws).reshape((n,1)),X), np.multiply(np.array(ws).reshape((n,1)),Y))
+            sigma = sum(np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 * ws[i] for i in range(0,n)) / (sum_ws * dim)
+            muy = sum(Y[i, :] * (1 - ws[i]) for i in range(0,n)) / (n-sum_ws)
+            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 * (1 - ws[i]) for i in range(0,n)) / ((n-sum_ws) * dim)
+        else:
+            t_indices = np.where(np.asarray(ws) >= 0.5)[0]
+            f_indices = np.where(np.asarray(ws) < 0.5)[0]
+            X_clean = np.squeeze(X[[t_indices], :])
+            Y_clean = np.squeeze(Y[[t_indices], :])
+            alpha = float(len(t_indices)) / float(n)
+            Q, _ = orthogonal_procrustes(X_clean, Y_clean)
+            sigma = sum(np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 for i in t_indices) / (len(t_indices) * dim)
+            muy = sum(Y[i, :] for i in f_indices) / len(f_indices)
+            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 for i in f_indices) / (len(f_indices) * dim)
+    t_indices = np.where(np.asarray(ws) >= 0.5)[0]
+    f_indices = np.where(np.asarray(ws) < 0.5)[0]
+    return np.asarray(Q), alpha, t_indices, f_indices
+
+
+def reference_noise_aware(X, Y, is_soft=False):
+    # original implementation of utils.noise_aware.noise_aware
+    n, dim = X.shape
+    Q_start, _ = orthogonal_procrustes(X, Y)
+    sigma_start = np.linalg.norm(np.dot(X,Q_start) - Y)**2 / (n * dim)
+    return reference_EM_aux(X, Y, 0.5, Q_start, sigma_start, np.mean(Y, axis=0), np.var(Y), is_soft)
+
+
+def synthetic_pairs(n, dim, noise, seed=0):
+    """
+    Create rotated pairs of vectors of which a portion is replaced by random (noisy) vectors
+    :param n: number of pairs
+    :param dim: dimension
+    :param noise: portion of noisy pairs
+    :param seed: random seed
+    :return: X, Y
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n, dim)
+    rotation, _ = np.linalg.qr(rng.randn(dim, dim))
+    Y = X.dot(rotation) + 0.1 * rng.randn(n, dim)
+    noisy = rng.rand(n) < noise
+    Y[noisy] = rng.randn(noisy.sum(), dim)
+    return X, Y
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vectorized and original noise aware alignment")
+    parser.add_argument('--n', type=int, default=20000, help="number of shared words")
+    parser.add_argument('--dim', type=int, default=100, help="embedding dimension")
+    parser.add_argument('--noise', type=float, default=0.3, help="portion of noisy pairs")
+    args = parser.parse_args()
+
+    X, Y = synthetic_pairs(args.n, args.dim, args.noise)
+    for is_soft in (False, True):
+        (Q, alpha, clean, noisy), t_new = timed(noise_aware, X, Y, is_soft=is_soft)
+        (Q_ref, alpha_ref, clean_ref, noisy_ref), t_ref = timed(reference_noise_aware, X, Y, is_soft=is_soft)
+
+        assert np.allclose(Q, Q_ref, atol=1e-6), "transform matrices differ"
+        assert np.isclose(alpha, alpha_ref), "alpha differs"
+        assert np.array_equal(clean, clean_ref) and np.array_equal(noisy, noisy_ref), "clean/noisy indices differ"
+        print("{} EM: alpha {:.3f}, original {:.2f}s, vectorized {:.2f}s, speedup {:.1f}x".format(
+            "soft" if is_soft else "hard", alpha, t_ref, t_new, t_ref / t_new))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Validation of the float32 compute mode: CCA measure, wall time and peak memory of every mapping algorithm
+with the embedding, shared vocab and mapped matrices in float64 and in float32.
+Run from the project root: python3 -m benchmarks.precision <src_emb> <trg_emb> <vocab>
+"""
+
+import os
+import argparse
+import tempfile
+import numpy as np
+from tabulate import tabulate
+from utils.UniversalityTests import UniversalityTests
+from utils.embeddings import EmbeddingRegistry
+from benchmarks.timing import measured
+
+
+def measure(registry, src_emb, trg_emb, vocab, algorithm):
+    """
+    :return: CCA measure after mapping, wall time and peak memory (MB) allocated by mapping and scoring
+    """
+    with measured(trace=True) as record:
+        embedding_tests = UniversalityTests(src_emb, trg_emb, vocab, registry=registry)
+        embedding_tests.map_spaces(algorithm)
+        score = np.mean(embedding_tests.get_embedding_correlations())
+    return score, record["seconds"], record["peak_mb"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the CCA measure computed in float64 and float32")
+    parser.add_argument('src_emb', type=str, help="source embedding")
+    parser.add_argument('trg_emb', type=str, help="target embedding")
+    parser.add_argument('vocab', type=str, help="file for loading/saving shared vocabulary")
+    parser.add_argument('--algorithms', type=str, nargs='+', default=["procrustes", "noise", "cca", "gcca"],
+                        help="mapping algorithms")
+    parser.add_argument('--tol', type=float, default=1e-4, help="maximum deviation of the CCA measure")
+    args = parser.parse_args()
+
+    src_emb, trg_emb, vocab = (os.path.abspath(path) for path in (args.src_emb, args.trg_emb, args.vocab))
+    registries = {dtype: EmbeddingRegistry(dtype=dtype) for dtype in (np.float64, np.float32)}
+    for registry in registries.values():
+        # loading is not part of the measurement
+        registry.preload([src_emb, trg_emb])
+
+    rows = []
+    # noise aware alignment writes the clean vocabulary to the working directory
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            for algorithm in args.algorithms:
+                score64, time64, peak64 = measure(registries[np.float64], src_emb, trg_emb, vocab, algorithm)
+                score32, time32, peak32 = measure(registries[np.float32], src_emb, trg_emb, vocab, algorithm)
+                rows.append([algorithm, score64, score32, abs(score64 - score32), time64, time32,
+                             peak64, peak32])
+        finally:
+            os.chdir(cwd)
+
+    print(tabulate(rows, headers=["algorithm", "measure float64", "measure float32", "deviation",
+                                  "time float64 (s)", "time float32 (s)", "peak MB float64", "peak MB float32"],
+                   floatfmt=("", ".6f", ".6f", ".1e", ".2f", ".2f", ".1f", ".1f")))
+    for row in rows:
+        assert row[3] < args.tol, "CCA measure of {} deviates by {}".format(row[0], row[3])
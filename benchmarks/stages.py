@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Wall time and peak memory of every stage of a comparison on synthetic embedding spaces
+(loading, shared vocabulary extraction, map_spaces and get_embedding_correlations per algorithm,
+and a domain_similarity.py style n x n matrix), written as json for tracking regressions.
+Run from the project root: python3 -m benchmarks.stages --output stages.json
+"""
+
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import scipy
+import gensim
+from utils.UniversalityTests import UniversalityTests
+from utils.embeddings import EmbeddingRegistry
+from utils.similarity_matrix import similarity_matrix
+from benchmarks.synthetic import save_synthetic_spaces
+from benchmarks.timing import measured
+
+
+@contextmanager
+def stage(results, name, trace=True, **info):
+    """
+    Measure a stage (see benchmarks.timing.measured), its record is added to results and printed as progress
+    """
+    with measured(trace, stage=name, **info) as record:
+        yield record
+    results.append(record)
+    print(json.dumps(record), file=sys.stderr)
+
+
+def run_stages(paths, work_dir, algorithms, processes=1, dtype=None, mmap=None, trace=True):
+    """
+    :param paths: synthetic embedding spaces (the pair stages use the first two)
+    :param work_dir: directory for the shared vocabulary files (the working directory during the stages)
+    :param algorithms: mapping algorithms
+    :param processes: number of worker processes for the matrix stage
+    :param dtype: compute precision (see EmbeddingRegistry)
+    :param mmap: memory map the embedding spaces
+    :param trace: whether to measure the peak memory (tracing slows down python code)
+    :return: list of stage records
+    """
+    results = []
+    src, trg = paths[:2]
+    vocab = os.path.join(work_dir, "pair.vocab.txt")
+    registry = EmbeddingRegistry(mmap=mmap, dtype=dtype)
+
+    with stage(results, "load", trace, spaces=2):
+        registry.preload([src, trg])
+    with stage(results, "get_vocab", trace) as record:
+        # the shared vocabulary is extracted (and written) when the vocab file does not exist
+        embedding_tests = UniversalityTests(src, trg, vocab, registry=registry)
+        record["shared_vocab"] = len(embedding_tests.shared_vocab)
+    with stage(results, "get_vocab", trace, cached=True):
+        UniversalityTests(src, trg, vocab, registry=registry)
+
+    for algorithm in algorithms:
+        embedding_tests = UniversalityTests(src, trg, vocab, registry=registry)
+        with stage(results, "map_spaces", trace, algorithm=algorithm):
+            embedding_tests.map_spaces(algorithm)
+        with stage(results, "get_embedding_correlations", trace, algorithm=algorithm) as record:
+            record["cca_measure"] = float(np.mean(embedding_tests.get_embedding_correlations()))
+
+    # complete comparison table on a new registry (including loading all spaces)
+    names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    # tracemalloc only sees the parent process, the memory of worker processes would be missing
+    with stage(results, "similarity_matrix", trace and processes == 1, spaces=len(paths), processes=processes):
+        similarity_matrix(paths, names, work_dir, "gcca", registry=EmbeddingRegistry(mmap=mmap, dtype=dtype),
+                          processes=processes)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory profile of the comparison stages")
+    parser.add_argument('--output', type=str, default="stages.json", help="json file for the results")
+    parser.add_argument('--spaces', type=int, default=4, help="number of spaces for the n x n matrix")
+    parser.add_argument('--vocab_size', type=int, default=50000, help="number of words per space")
+    parser.add_argument('--dim', type=int, default=100, help="dimension")
+    parser.add_argument('--overlap', type=float, default=0.8, help="portion of common words per space")
+    parser.add_argument('--correlation', type=float, default=0.7, help="correlation of the latent dimensions")
+    parser.add_argument('--noise', type=float, default=0.1, help="portion of unrelated common word vectors")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--algorithms', type=str, nargs='+', default=["procrustes", "noise", "cca", "gcca"],
+                        help="mapping algorithms")
+    parser.add_argument('--processes', type=int, default=1, help="number of worker processes for the matrix")
+    parser.add_argument('--float32', action='store_true', help="float32 compute mode")
+    parser.add_argument('--mmap', action='store_true', help="memory map the embedding spaces")
+    parser.add_argument('--no-trace', action='store_true', help="only measure wall time")
+    args = parser.parse_args()
+
+    config = vars(args).copy()
+    output = os.path.abspath(args.output)
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = save_synthetic_spaces(os.path.join(work_dir, "embeddings"), n_spaces=args.spaces,
+                                      vocab_size=args.vocab_size, dim=args.dim, overlap=args.overlap,
+                                      correlation=args.correlation, noise=args.noise, seed=args.seed)
+        cwd = os.getcwd()
+        # noise aware alignment writes the clean vocabulary to the working directory
+        os.chdir(work_dir)
+        try:
+            stages = run_stages(paths, work_dir, args.algorithms, processes=args.processes,
+                                dtype=np.float32 if args.float32 else None, mmap='r' if args.mmap else None,
+                                trace=not args.no_trace)
+        finally:
+            os.chdir(cwd)
+
+    environment = {"python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+                   "gensim": gensim.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+    with open(output, "w") as out:
+        json.dump({"config": config, "environment": environment, "stages": stages}, out, indent=1)
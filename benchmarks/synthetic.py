@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic embedding spaces for benchmarks (no pre-trained embeddings needed).
+Every space contains a shared part of a common vocabulary, whose vectors are rotated noisy copies of common latent
+vectors (so that the spaces are related as embeddings trained on similar corpora), and words of its own.
+Run from the project root to write spaces to a directory: python3 -m benchmarks.synthetic <out_dir>
+"""
+
+import os
+import argparse
+import numpy as np
+from gensim.models.keyedvectors import KeyedVectors
+
+
+def synthetic_spaces(n_spaces=2, vocab_size=50000, dim=100, overlap=0.8, correlation=0.7, noise=0.1, seed=0):
+    """
+    Generate related embedding spaces
+    :param n_spaces: number of spaces
+    :param vocab_size: number of words per space
+    :param dim: dimension
+    :param overlap: portion of the vocabulary of every space drawn from the common vocabulary (the shared
+    vocabulary of two spaces is about overlap^2 * vocab_size words)
+    :param correlation: correlation between the latent dimensions of two spaces (the expected canonical
+    correlations), scalar or one value per dimension
+    :param noise: portion of common words whose vectors are unrelated to the latent vectors in a space
+    (as mistranslations or words with different meanings in different domains)
+    :param seed: random seed
+    :return: list of KeyedVectors
+    """
+    rng = np.random.RandomState(seed)
+    correlation = np.broadcast_to(correlation, (dim,))
+    n_common = int(overlap * vocab_size)
+    # every space contains a random part of the common vocabulary (of vocab_size words)
+    common_words = ["common{}".format(i) for i in range(vocab_size)]
+    latent = rng.randn(len(common_words), dim)
+
+    spaces = []
+    for i in range(n_spaces):
+        common = np.sort(rng.choice(len(common_words), n_common, replace=False))
+        vectors = np.sqrt(correlation) * latent[common] + np.sqrt(1 - correlation) * rng.randn(n_common, dim)
+        noisy = rng.rand(n_common) < noise
+        vectors[noisy] = rng.randn(noisy.sum(), dim)
+        # words of this space only
+        vectors = np.concatenate([vectors, rng.randn(vocab_size - n_common, dim)])
+        words = [common_words[j] for j in common] + ["space{}_{}".format(i, j) for j in range(vocab_size - n_common)]
+
+        # random rotation, so that the dimensions of different spaces are not aligned before mapping,
+        # and random word order (as the frequency order of trained spaces)
+        rotation, _ = np.linalg.qr(rng.randn(dim, dim))
+        order = rng.permutation(vocab_size)
+        model = KeyedVectors(dim)
+        model.add([words[j] for j in order], vectors[order].dot(rotation).astype(np.float32))
+        spaces.append(model)
+    return spaces
+
+
+def save_synthetic_spaces(out_dir, names=None, **kwargs):
+    """
+    Generate and save related embedding spaces (arguments as synthetic_spaces)
+    :param out_dir: output directory
+    :param names: file names of the spaces (defaults to synthetic<i>.emb)
+    :return: paths to the embedding spaces
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    spaces = synthetic_spaces(**kwargs)
+    names = names or ["synthetic{}.emb".format(i) for i in range(len(spaces))]
+    paths = [os.path.join(out_dir, name) for name in names]
+    for model, path in zip(spaces, paths):
+        # vectors are stored in a separate .npy file, so that they can be memory mapped
+        model.save(path, separately=["vectors"])
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic embedding spaces")
+    parser.add_argument('out_dir', type=str, help="output directory")
+    parser.add_argument('--spaces', type=int, default=2, help="number of spaces")
+    parser.add_argument('--vocab_size', type=int, default=50000, help="number of words per space")
+    parser.add_argument('--dim', type=int, default=100, help="dimension")
+    parser.add_argument('--overlap', type=float, default=0.8, help="portion of common words per space")
+    parser.add_argument('--correlation', type=float, default=0.7, help="correlation of the latent dimensions")
+    parser.add_argument('--noise', type=float, default=0.1, help="portion of unrelated common word vectors")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    for path in save_synthetic_spaces(args.out_dir, n_spaces=args.spaces, vocab_size=args.vocab_size, dim=args.dim,
+                                      overlap=args.overlap, correlation=args.correlation, noise=args.noise,
+                                      seed=args.seed):
+        print(path)
@@ -0,0 +1,37 @@
+# Wall time and peak memory measurement shared by the benchmark scripts
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+@contextmanager
+def measured(trace=False, **info):
+    """
+    Measure the wall time and (if traced) the peak memory allocated in the block, e.g.
+    with measured(trace=True, stage="fit") as record: ...
+    the measurements are added to the yielded record when the block is left
+    :param trace: whether to measure the peak memory (numpy allocations are traced by tracemalloc, which slows
+    down python code)
+    :param info: information added to the record
+    """
+    record = dict(info)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        if trace:
+            record["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+
+
+def timed(func, *args, **kwargs):
+    """
+    :return: result of func(*args, **kwargs) and its wall time in seconds
+    """
+    with measured() as record:
+        result = func(*args, **kwargs)
+    return result, record["seconds"]
@@ -36,7 +36,7 @@ simulation(){
   # compare embeddings
   conda activate embeddings
   cd $3
-  python3 ../mapping_correlation.py corpus.1.$2.en.emb corpus.2.$2.en.emb vocab.$2.txt
+  python3 ../mapping_correlation.py corpus.1.$2.en.emb corpus.2.$2.en.emb vocab.$2.txt --run $2
 
 }  # end of simulation
 
@@ -70,8 +70,6 @@ if [[ ! -f ${EMBEDDING_DIR}${CORPUS2}.emb ]]; then
 fi
 
 cd ${OUT_DIR}
-# create output file
-touch ${OUT_DIR}/$3.csv
 
 # get original correlation
 conda activate embeddings
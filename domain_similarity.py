@@ -7,16 +7,28 @@ and create LaTeX table
 
 import logging
 import argparse
-from tabulate import tabulate
 import numpy as np
-from utils.UniversalityTests import UniversalityTests
+from utils.similarity_matrix import similarity_matrix, latex_table
+from utils.multi_space import MultiSpaceTests
+from utils.embeddings import EmbeddingRegistry
+from utils.cache import ResultCache
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
 
 parser = argparse.ArgumentParser(description="Calculate CCA measure for all specified corpus combinations")
 parser.add_argument('emb_path', type=str, help="Path to pre-trained embeddings")
 parser.add_argument('work_dir', type=str, help="Where to store results and LaTeX output file")
+parser.add_argument('--processes', type=int, default=1, help="Number of worker processes for the pairwise comparisons")
+parser.add_argument('--save-mapped', action='store_true', help="transform and save the complete mapped embedding spaces")
+parser.add_argument('--cache', type=str, default=None, help="directory for caching mappings and correlations of compared pairs")
+parser.add_argument('--mmap', action='store_true', help="memory map the embedding spaces read-only instead of loading them into RAM")
+parser.add_argument('--float32', action='store_true', help="keep embeddings, shared vocab and mapped matrices in float32 (statistics are accumulated in float64)")
+parser.add_argument('--resamples', type=int, default=0, help="number of bootstrap replicates/permutations for confidence intervals and p-values of the CCA measure")
+parser.add_argument('--threads', type=int, default=4, help="number of resampling threads per process")
+parser.add_argument('--joint', action='store_true', help="map all spaces jointly with a single multi-view GCCA (on the vocabulary shared by all spaces) instead of comparing every pair")
 args = parser.parse_args()
+if args.joint and args.resamples:
+    parser.error("--resamples is only available for pairwise comparisons")
 
 embeddings = ["books.en.emb", "dvd.en.emb", "electronics.en.emb", "kitchen.en.emb"] #"wiki.1.en.emb", "wiki.2.en.emb", "sub.en.emb", "dgt.en.emb", "euro.en.emb", "med.en.emb"]
 
@@ -24,26 +36,27 @@ algorithm = "gcca"  # "procrustes" "noise"
 
 # calculate distances
 headers = ['books', 'dvd', 'electronics', 'kitchen']#'wiki1', 'wiki2', 'sub', 'dgt', 'euro', 'med']
-distances = [[], [], [], []] #, [], []]
 
-for i, source_emb in enumerate(embeddings):
-    distances[i].append(headers[i])
-    for j, target_emb in enumerate(embeddings):
-
-        # load embeddings
-        embedding_tests = UniversalityTests(args.emb_path+source_emb, args.emb_path+target_emb, args.work_dir+headers[i]+"_"+headers[j]+".vocab.txt")
-
-        # map spaces
-        embedding_tests.map_spaces(algorithm, src_mapped_embed="mapped_src_" + source_emb,
-                                   trg_mapped_embed="mapped_trg_" + target_emb)
-
-        # calculate CCA measure
-        corr = embedding_tests.get_embedding_correlations()
-        cca_measure = np.mean(corr)
-        distances[i].append(cca_measure)
-
-latex = tabulate(distances, headers=[''] + headers, floatfmt='0.2f',
-                          tablefmt='latex')
+registry = EmbeddingRegistry(mmap='r' if args.mmap else None, dtype=np.float32 if args.float32 else None)
+if args.joint:
+    # all spaces are aligned jointly, the pairwise correlations are read off the joint covariance
+    joint_tests = MultiSpaceTests([args.emb_path + emb for emb in embeddings], args.work_dir + 'joint.vocab.txt',
+                                  registry=registry)
+    matrix = joint_tests.similarity_matrix()
+    if args.save_mapped:
+        joint_tests.save_mapped([args.work_dir + 'joint_{}.emb'.format(name) for name in headers])
+else:
+    # each embedding space is loaded once and only the upper triangle of the (symmetric) matrix is computed
+    matrix = similarity_matrix([args.emb_path + emb for emb in embeddings], headers, args.work_dir, algorithm,
+                               registry=registry, processes=args.processes,
+                               save_mapped=args.save_mapped, cache=ResultCache(args.cache) if args.cache else None,
+                               resamples=args.resamples, workers=args.threads)
+if args.resamples:
+    # cells with 95% confidence intervals, followed by a table of the permutation p-values
+    matrix, ci_low, ci_high, p_values = matrix
+    latex = latex_table(matrix, headers, ci_low, ci_high, p_values)
+else:
+    latex = latex_table(matrix, headers)
 print(latex)
 with open(args.work_dir+'similarity_table.txt', 'w') as out:
     out.write(latex)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+'''
+Single entry point for all comparisons: emb_sim.py pair|batch|matrix|simulate|plot
+Only the modules of the chosen subcommand are imported (e.g. matplotlib only for plot, gensim only when a space
+is actually loaded), so short invocations do not pay the import cost of the whole project.
+For many comparisons, run batch once on a file of pairs instead of calling pair for each of them.
+'''
+
+import os
+import logging
+import argparse
+
+
+def get_registry(args):
+    import numpy as np
+    from utils.embeddings import EmbeddingRegistry
+    return EmbeddingRegistry(mmap='r' if args.mmap else None, dtype=np.float32 if args.float32 else None)
+
+
+def get_cache(args):
+    if not args.cache:
+        return None
+    from utils.cache import ResultCache
+    return ResultCache(args.cache)
+
+
+def pair(args):
+    from utils.pair_comparison import compare_pair, compare_algorithms
+    registry = get_registry(args)
+    if args.algorithms:
+        for name, score in compare_algorithms(registry, args.work_dir, args.src_emb, args.trg_emb, args.vocab,
+                                              args.algorithms, dictionary=args.dict, cache=get_cache(args),
+                                              run=args.run):
+            print("{}\t{:0.4f}".format(name, score))
+    else:
+        cca_measure_pre, cca_measure_post = compare_pair(registry, args.work_dir, args.src_emb, args.trg_emb,
+                                                         args.vocab, dictionary=args.dict, algorithm=args.algorithm,
+                                                         cache=get_cache(args), run=args.run)
+        print("{}\t{:.4f}\t{:.4f}".format(args.work_dir, cca_measure_pre, cca_measure_post))
+    if args.neighbours:
+        import numpy as np
+        from utils.UniversalityTests import UniversalityTests
+        # same shared vocabulary and loaded spaces as the comparison above
+        embedding_tests = UniversalityTests(args.src_emb, args.trg_emb, os.path.join(args.work_dir, args.vocab),
+                                            dictionary=args.dict, registry=registry)
+        print("neighbours\t{:.4f}".format(np.mean(embedding_tests.get_neighbour_overlap(args.neighbours))))
+
+
+def batch(args):
+    from utils.pair_comparison import read_pairs, compare_batch
+    pairs = read_pairs(args.pairs)
+    scores = compare_batch(get_registry(args), pairs, algorithm=args.algorithm, cache=get_cache(args),
+                           processes=args.processes)
+    for pair, (cca_measure_pre, cca_measure_post) in zip(pairs, scores):
+        print("{}\t{:.4f}\t{:.4f}".format(pair[0], cca_measure_pre, cca_measure_post))
+
+
+def matrix(args):
+    from utils.similarity_matrix import similarity_matrix, latex_table
+    names = args.names or [os.path.basename(embed).split(".")[0] for embed in args.embeddings]
+    os.makedirs(args.work_dir, exist_ok=True)
+    registry = get_registry(args)
+    if args.neighbours:
+        from utils.similarity_matrix import neighbour_matrix
+        latex = latex_table(neighbour_matrix(args.embeddings, names, args.work_dir, k=args.neighbours,
+                                             registry=registry), names)
+    elif args.joint:
+        from utils.multi_space import MultiSpaceTests
+        joint_tests = MultiSpaceTests(args.embeddings, os.path.join(args.work_dir, 'joint.vocab.txt'), registry=registry)
+        latex = latex_table(joint_tests.similarity_matrix(), names)
+        if args.save_mapped:
+            joint_tests.save_mapped([os.path.join(args.work_dir, 'joint_{}.emb'.format(name)) for name in names])
+    else:
+        result = similarity_matrix(args.embeddings, names, args.work_dir, args.algorithm, registry=registry,
+                                   processes=args.processes, save_mapped=args.save_mapped, cache=get_cache(args),
+                                   resamples=args.resamples, workers=args.threads)
+        if args.resamples:
+            # cells with 95% confidence intervals, followed by a table of the permutation p-values
+            similarities, ci_low, ci_high, p_values = result
+            latex = latex_table(similarities, names, ci_low, ci_high, p_values)
+        else:
+            latex = latex_table(result, names)
+    print(latex)
+    with open(os.path.join(args.work_dir, 'similarity_table.txt'), 'w') as out:
+        out.write(latex)
+
+
+def simulate(args):
+    from utils.simulation import ExternalTrainer, original_embeddings, run_simulation, TRAIN_CMD
+    if args.trainer == "native":
+        from utils.ppmi_svd import PPMISVDTrainer
+        trainer = PPMISVDTrainer(workers=args.workers)
+    else:
+        trainer = ExternalTrainer(args.train_cmd or TRAIN_CMD, os.path.abspath(args.train_dir))
+    os.makedirs(args.sim_dir, exist_ok=True)
+    orig_embeddings = original_embeddings([args.corpus1, args.corpus2], args.embedding_dir, args.sim_dir, trainer)
+    run_simulation([args.corpus1, args.corpus2], orig_embeddings, args.sim_dir, trainer, runs=args.runs, size=args.size,
+                   seed=args.seed, train_workers=args.train_workers, compare_workers=args.compare_workers,
+                   algorithm=args.algorithm)
+
+
+def plot(args):
+    from visualize import visualize
+    visualize(os.path.abspath(args.parent), simulations=args.simulations, algorithm=args.algorithm)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Compare embedding spaces with the CCA measure")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    # options of all subcommands loading embedding spaces
+    spaces = argparse.ArgumentParser(add_help=False)
+    spaces.add_argument('--cache', type=str, default=None, help="directory for caching mappings and correlations of compared pairs")
+    spaces.add_argument('--mmap', action='store_true', help="memory map the embedding spaces read-only instead of loading them into RAM")
+    spaces.add_argument('--float32', action='store_true', help="keep embeddings, shared vocab and mapped matrices in float32 (statistics are accumulated in float64)")
+    spaces.add_argument('--algorithm', type=str, default="gcca", choices=["procrustes", "noise", "cca", "gcca"], help="mapping algorithm")
+
+    sub = subparsers.add_parser('pair', parents=[spaces], help="compare two embedding spaces (as mapping_correlation.py)")
+    sub.add_argument('src_emb', type=str, help="source embedding")
+    sub.add_argument('trg_emb', type=str, help="target embedding")
+    sub.add_argument('vocab', type=str, help="file for loading/saving shared vocabulary (relative to work_dir)")
+    sub.add_argument('dict', nargs='?', default=None, type=str, help="dictionary for extracting shared vocabulary in cross-lingual comparison")
+    sub.add_argument('--work_dir', type=str, default=".", help="directory for the results (named after the comparison)")
+    sub.add_argument('--run', type=int, default=0, help="simulation run the compared spaces were trained in (0 for the original spaces)")
+    sub.add_argument('--algorithms', type=str, nargs='+', default=None, help="compare several mapping algorithms (procrustes noise cca gcca) on the same loaded spaces")
+    sub.add_argument('--neighbours', type=int, default=0, help="also compute the overlap of the given number of nearest neighbours of the shared words")
+    sub.set_defaults(func=pair)
+
+    sub = subparsers.add_parser('batch', parents=[spaces], help="compare a batch of pairs in one process (as mapping_correlation_batch.py)")
+    sub.add_argument('pairs', type=str, help="file with one comparison per line: work_dir src_emb trg_emb vocab [dict] (- for stdin)")
+    sub.add_argument('--processes', type=int, default=1, help="number of worker processes")
+    sub.set_defaults(func=batch)
+
+    sub = subparsers.add_parser('matrix', parents=[spaces], help="CCA measures of all combinations of spaces (as domain_similarity.py)")
+    sub.add_argument('work_dir', type=str, help="where to store the shared vocabularies and the LaTeX table")
+    sub.add_argument('embeddings', type=str, nargs='+', help="pre-trained embedding spaces")
+    sub.add_argument('--names', type=str, nargs='+', default=None, help="table headers (defaults to the file names up to the first dot)")
+    sub.add_argument('--processes', type=int, default=1, help="number of worker processes for the pairwise comparisons")
+    sub.add_argument('--save-mapped', action='store_true', help="transform and save the complete mapped embedding spaces")
+    sub.add_argument('--resamples', type=int, default=0, help="number of bootstrap replicates/permutations for confidence intervals and p-values of the CCA measure")
+    sub.add_argument('--threads', type=int, default=4, help="number of resampling threads per process")
+    sub.add_argument('--joint', action='store_true', help="map all spaces jointly with a single multi-view GCCA instead of comparing every pair")
+    sub.add_argument('--neighbours', type=int, default=0, help="table of the overlap of the given number of nearest neighbours of the shared words instead of the CCA measure")
+    sub.set_defaults(func=matrix)
+
+    sub = subparsers.add_parser('simulate', help="simulation study on random corpus halves (as simulation.py)")
+    sub.add_argument('corpus1', type=str, help="first (preprocessed) corpus")
+    sub.add_argument('corpus2', type=str, help="second (preprocessed) corpus")
+    sub.add_argument('sim_dir', type=str, help="directory for all simulation files (named after the comparison)")
+    sub.add_argument('--embedding_dir', type=str, default="embeddings/en_260MB/", help="directory of the original embeddings")
+    sub.add_argument('--runs', type=int, default=100, help="number of simulations")
+    sub.add_argument('--size', type=int, default=260 * 10**6, help="size of each corpus half in bytes")
+    sub.add_argument('--seed', type=int, default=0, help="random seed")
+    sub.add_argument('--train_workers', type=int, default=4, help="maximum number of concurrent trainings")
+    sub.add_argument('--compare_workers', type=int, default=2, help="maximum number of concurrent comparisons")
+    sub.add_argument('--trainer', type=str, default="external", choices=["external", "native"],
+                     help="train with the external command or with the built-in PPMI+SVD implementation")
+    sub.add_argument('--workers', type=int, default=4, help="number of processes/threads of the native trainer")
+    # default of utils.simulation.TRAIN_CMD (not imported to keep the parser fast)
+    sub.add_argument('--train_cmd', type=str, default=None, help="training command with placeholders {corpus} and {output}")
+    sub.add_argument('--train_dir', type=str, default=".", help="directory the training command is run in (PPMI+SVD implementation)")
+    sub.add_argument('--algorithm', type=str, default="gcca", choices=["procrustes", "noise", "cca", "gcca"], help="mapping algorithm")
+    sub.set_defaults(func=simulate)
+
+    sub = subparsers.add_parser('plot', help="plot the dimension-wise correlations (as visualize.py)")
+    sub.add_argument('parent', type=str, help="directory containing the results store of the comparisons in its sub folders")
+    sub.add_argument('--simulations', action='store_true', help="also plot the density of the simulation results")
+    sub.add_argument('--algorithm', type=str, default="gcca", help="mapping algorithm of the plotted correlations")
+    sub.set_defaults(func=plot)
+    return parser
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.command == "matrix":
+        if args.names and len(args.names) != len(args.embeddings):
+            parser.error("--names needs one name per embedding space")
+        if args.joint and args.resamples:
+            parser.error("--resamples is only available for pairwise comparisons")
+        if args.neighbours and (args.joint or args.resamples):
+            parser.error("--neighbours can not be combined with --joint or --resamples")
+    args.func(args)
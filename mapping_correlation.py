@@ -5,12 +5,11 @@ Compute CCA measure for two pre-trained embedding spaces
 '''
 
 import argparse
-import logging
-import os
 import numpy as np
-import csv
-import threading
-from utils.UniversalityTests import UniversalityTests
+import logging
+from utils.pair_comparison import compare_pair, compare_algorithms
+from utils.embeddings import EmbeddingRegistry
+from utils.cache import ResultCache
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
 
@@ -20,41 +19,29 @@ parser.add_argument('trg_emb', type=str, help="target embedding")
 parser.add_argument('vocab', type=str, help="file for loading/saving shared vocabulary")
 parser.add_argument('dict', nargs='?', default=None, type=str, help="dictionary for extracting shared vocabulary in cross-lingual comparison")
 
+parser.add_argument('--cache', type=str, default=None, help="directory for caching mappings and correlations of compared pairs")
+parser.add_argument('--mmap', action='store_true', help="memory map the embedding spaces read-only instead of loading them into RAM")
+parser.add_argument('--float32', action='store_true', help="keep embeddings, shared vocab and mapped matrices in float32 (statistics are accumulated in float64)")
+parser.add_argument('--run', type=int, default=0, help="simulation run the compared spaces were trained in (0 for the original spaces)")
+parser.add_argument('--algorithms', type=str, nargs='+', default=None, help="compare several mapping algorithms (procrustes noise cca gcca) on the same loaded spaces")
 args = parser.parse_args()
 
-# csv file will contain dimensions-wise correlations for visualization
-csv_file = os.path.basename(os.getcwd()) + ".csv"
-csv_writer_lock = threading.Lock()
-# log file will contain CCA measure scores before and after mapping embedding spaces
-logfile = os.path.basename(os.getcwd()) + ".log"
-
 algorithm = "gcca"  # "procrustes" "noise"
 
-with open(csv_file, mode='a') as corr_file:
-    corr_writer = csv.writer(corr_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-
-    # load embeddings
-    embedding_tests = UniversalityTests(args.src_emb, args.trg_emb, args.vocab, dictionary=args.dict)
-
-    # calculate dimension wise correlations
-    corr = embedding_tests.get_embedding_correlations()
-    # convert to CCA measure
-    cca_measure_pre = np.mean(corr)
-
-    # map spaces
-    embedding_tests.map_spaces(algorithm, src_mapped_embed="mapped_src_" + os.path.basename(args.src_emb),
-                               trg_mapped_embed="mapped_trg_" + os.path.basename(args.trg_emb))
-
-    # calculate dimension wise correlations
-    corr_post = embedding_tests.get_embedding_correlations()
-    # convert to CCA measure
-    cca_measure_post = np.mean(corr_post)
-
-    with open(logfile, 'w') as out:
-        out.write("Pre-map scores\nCCA measure: {}\nPost-map scores\nCCA measure: {}\n".format(cca_measure_pre, cca_measure_post))
-
-    with csv_writer_lock:
-        if algorithm == "gcca":
-            # gcca implementation returns correlations in ascending order
-            corr_post = np.flip(corr_post)
-        corr_writer.writerow(corr_post)
+registry = EmbeddingRegistry(mmap='r' if args.mmap else None, dtype=np.float32 if args.float32 else None)
+
+if args.algorithms:
+    # table file (<cwd>.algorithms.txt) will contain CCA measure scores before and after mapping with every algorithm
+    # json lines file (<cwd>.jsonl) will contain time and memory of the comparison stages
+    for name, score in compare_algorithms(registry, ".", args.src_emb, args.trg_emb, args.vocab, args.algorithms,
+                                          dictionary=args.dict, cache=ResultCache(args.cache) if args.cache else None,
+                                          run=args.run):
+        print("{}\t{:0.4f}".format(name, score))
+else:
+    # dimension-wise correlations before and after mapping are appended to the results store (../results.store)
+    # json lines file (<cwd>.jsonl) will contain time and memory of the comparison stages
+    cca_measure_pre, cca_measure_post = compare_pair(registry, ".", args.src_emb, args.trg_emb, args.vocab,
+                                                     dictionary=args.dict, algorithm=algorithm,
+                                                     cache=ResultCache(args.cache) if args.cache else None,
+                                                     run=args.run)
+    print("Pre-map scores\nCCA measure: {}\nPost-map scores\nCCA measure: {}".format(cca_measure_pre, cca_measure_post))
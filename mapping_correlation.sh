@@ -2,33 +2,23 @@
 
 # adapt language and embed dir as required
 LANG=en
-SCRIPT=../../mapping_correlation.py
-EMBED_DIR=../../embeddings/${LANG}_260MB
+SCRIPT=mapping_correlation_batch.py
+EMBED_DIR=embeddings/${LANG}_260MB
+# number of comparisons run in parallel
+PROCESSES=6
 
-mkdir -p correlation/wiki1-wiki1
-cd correlation/wiki1-wiki1
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/wiki.1.${LANG}.emb vocab.txt &>mapping.log
+mkdir -p correlation
 
-mkdir ../wiki1-wiki2
-cd ../wiki1-wiki2
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/wiki.2.${LANG}.emb vocab.txt &>mapping.log
+# one comparison per line: work dir, source embedding, target embedding, shared vocabulary (relative to work dir)
+cat > correlation/pairs.txt <<PAIRS
+correlation/wiki1-wiki1 ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/wiki.1.${LANG}.emb vocab.txt
+correlation/wiki1-wiki2 ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/wiki.2.${LANG}.emb vocab.txt
+correlation/wiki-euro ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/euro.${LANG}.emb vocab.txt
+correlation/wiki-dgt ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/dgt.${LANG}.emb vocab.txt
+correlation/wiki-sub ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/sub.${LANG}.emb vocab.txt
+correlation/wiki-med ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/med.${LANG}.emb vocab.txt
+PAIRS
 
-mkdir ../wiki-euro
-cd ../wiki-euro
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/euro.${LANG}.emb vocab.txt &>mapping.log
+python3 ${SCRIPT} correlation/pairs.txt --processes ${PROCESSES} &>correlation/mapping.log
 
-mkdir  ../wiki-dgt
-cd ../wiki-dgt
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/dgt.${LANG}.emb vocab.txt &>mapping.log
-
-mkdir ../wiki-sub
-cd ../wiki-sub
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/sub.${LANG}.emb vocab.txt &>mapping.log
-
-mkdir ../wiki-med
-cd ../wiki-med
-python3 ${SCRIPT} ${EMBED_DIR}/wiki.1.${LANG}.emb ${EMBED_DIR}/med.${LANG}.emb vocab.txt &>mapping.log
-
-cd ../..
 python3 visualize.py correlation/
-
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+'''
+Compute CCA measure for a batch of embedding space pairs on a pool of worker processes
+(same outputs as running mapping_correlation.py in each of the work directories)
+'''
+
+import argparse
+import numpy as np
+import logging
+from utils.pair_comparison import read_pairs, compare_batch
+from utils.embeddings import EmbeddingRegistry
+from utils.cache import ResultCache
+
+logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+
+parser = argparse.ArgumentParser(description="Compute correlation after mapping pairs of embedding spaces")
+parser.add_argument('pairs', type=str, help="file with one comparison per line: work_dir src_emb trg_emb vocab [dict]")
+parser.add_argument('--processes', type=int, default=1, help="number of worker processes")
+
+parser.add_argument('--cache', type=str, default=None, help="directory for caching mappings and correlations of compared pairs")
+parser.add_argument('--mmap', action='store_true', help="memory map the embedding spaces read-only instead of loading them into RAM")
+parser.add_argument('--float32', action='store_true', help="keep embeddings, shared vocab and mapped matrices in float32 (statistics are accumulated in float64)")
+args = parser.parse_args()
+
+algorithm = "gcca"  # "procrustes" "noise"
+
+pairs = read_pairs(args.pairs)
+registry = EmbeddingRegistry(mmap='r' if args.mmap else None, dtype=np.float32 if args.float32 else None)
+scores = compare_batch(registry, pairs, algorithm=algorithm, cache=ResultCache(args.cache) if args.cache else None,
+                       processes=args.processes)
+for pair, (cca_measure_pre, cca_measure_post) in zip(pairs, scores):
+    print("{}\t{:.4f}\t{:.4f}".format(pair[0], cca_measure_pre, cca_measure_post))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+'''
+Simulation study (in-process replacement of corpus_simulation.sh):
+compare embeddings trained on two corpora with embeddings trained on random disjoint halves of the joined corpora
+'''
+
+import os
+import argparse
+import logging
+from utils.simulation import ExternalTrainer, original_embeddings, run_simulation, TRAIN_CMD
+
+logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
+
+parser = argparse.ArgumentParser(description="Simulate comparisons of embeddings trained on random corpus halves")
+parser.add_argument('corpus1', type=str, help="first (preprocessed) corpus")
+parser.add_argument('corpus2', type=str, help="second (preprocessed) corpus")
+parser.add_argument('sim_dir', type=str, help="directory for all simulation files (named after the comparison)")
+parser.add_argument('--embedding_dir', type=str, default="embeddings/en_260MB/", help="directory of the original embeddings")
+parser.add_argument('--runs', type=int, default=100, help="number of simulations")
+parser.add_argument('--size', type=int, default=260 * 10**6, help="size of each corpus half in bytes")
+parser.add_argument('--seed', type=int, default=0, help="random seed")
+parser.add_argument('--train_workers', type=int, default=4, help="maximum number of concurrent trainings")
+parser.add_argument('--compare_workers', type=int, default=2, help="maximum number of concurrent comparisons")
+parser.add_argument('--trainer', type=str, default="external", choices=["external", "native"],
+                    help="train with the external command or with the built-in PPMI+SVD implementation")
+parser.add_argument('--workers', type=int, default=4, help="number of processes/threads of the native trainer")
+parser.add_argument('--train_cmd', type=str, default=TRAIN_CMD, help="training command with placeholders {corpus} and {output}")
+parser.add_argument('--train_dir', type=str, default=".", help="directory the training command is run in (PPMI+SVD implementation)")
+
+args = parser.parse_args()
+
+if args.trainer == "native":
+    from utils.ppmi_svd import PPMISVDTrainer
+    trainer = PPMISVDTrainer(workers=args.workers)
+else:
+    trainer = ExternalTrainer(args.train_cmd, os.path.abspath(args.train_dir))
+os.makedirs(args.sim_dir, exist_ok=True)
+
+# train original embeddings if they do not exist
+orig_embeddings = original_embeddings([args.corpus1, args.corpus2], args.embedding_dir, args.sim_dir, trainer)
+
+run_simulation([args.corpus1, args.corpus2], orig_embeddings, args.sim_dir, trainer, runs=args.runs, size=args.size,
+               seed=args.seed, train_workers=args.train_workers, compare_workers=args.compare_workers)
@@ -1,18 +1,19 @@
 #!/usr/bin/env python3
 
 import os
+import copy
 import logging
 import random
 import numpy as np
-from collections import defaultdict
-from gensim.models.keyedvectors import KeyedVectors  # for loading pre-trained word vectors
-from sklearn.cross_decomposition import CCA
-from utils.gcca import GCCA  # gcca implementation (faster than cca)
+from utils.cca import CCA  # direct cca solver (whitening and svd)
+from utils.gcca import GCCA, canonical_correlations  # gcca implementation
 from utils.noise_aware import noise_aware  # procrustes adaptation by Lubin et al. (2019)
-# from tabulate import tabulate # for creating LaTeX tables
-import matplotlib
-matplotlib.use('Agg') # needed to create plots on server
-import matplotlib.pyplot as plt
+from utils.embeddings import EmbeddingRegistry  # loads every embedding space only once
+from utils.statistics import accumulate  # streaming mean and covariance
+from utils.vocab_index import load_dictionary, as_words  # cached dictionary lookups
+from utils.resampling import BlockMoments, significance  # bootstrap and permutation tests
+from utils.instrumentation import Instrumentation, shape  # timing and memory of the stages
+from utils.neighbours import neighbour_overlap  # k nearest neighbours in both spaces
 
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.DEBUG)
@@ -23,124 +24,344 @@ class UniversalityTests:
     """
     Main class for loading, mappig and calculating correlations of embedding spaces
     """
-    def __init__(self, src_embed, trg_embed, vocab_file, dictionary=None, norm=False):
-
+    def __init__(self, src_embed, trg_embed, vocab_file, dictionary=None, norm=False, registry=None, mmap=None,
+                 dtype=None, instrumentation=None):
+        """
+        :param dtype: precision of the embedding, shared vocab and mapped matrices (e.g. np.float32 to halve their
+        memory), defaults to the dtype of the registry (None keeps the stored dtype and float64 mapping results).
+        Statistics are always accumulated and decompositions always solved in float64.
+        :param instrumentation: Instrumentation recording time and memory of the stages (load, vocab, fit,
+        transform, save, score), records are only kept in memory if None
+        """
         self.norm = norm
-        # load pre-trained word vectors
+        self.instrumentation = instrumentation or Instrumentation()
+        # load pre-trained word vectors (pass a shared registry to reuse spaces across instances,
+        # mmap='r' shares one read-only page cache copy of the raw spaces among concurrent comparisons)
         logging.debug("Loading embeddings")
-        self.model_src = KeyedVectors.load(src_embed)
-        self.model_trg = KeyedVectors.load(trg_embed)
+        if registry is None:
+            registry = EmbeddingRegistry(mmap=mmap, dtype=dtype)
+        self.dtype = dtype if dtype is not None else registry.dtype
+        # kept for the nearest neighbours, which the registry computes once per space (see get_neighbour_overlap)
+        self.registry = registry
+        self.src_embed, self.trg_embed = src_embed, trg_embed
+        with self.instrumentation.stage("load") as record:
+            # the registry models may be shared with other instances, so we work on shallow copies
+            # whose vectors are replaced (never modified in place) when mapping the spaces
+            self.model_src = copy.copy(registry.get(src_embed, norm=self.norm))
+            self.model_trg = copy.copy(registry.get(trg_embed, norm=self.norm))
+            record.update(src_shape=shape(self.model_src.vectors), trg_shape=shape(self.model_trg.vectors))
 
-        if self.norm:
-            # create l2 normalized vectors (replacing vectors with norm)
-            self.model_src.init_sims(replace=True)
-            self.model_trg.init_sims(replace=True)
+        with self.instrumentation.stage("vocab", from_file=os.path.isfile(vocab_file)) as record:
+            # get shared vocab (as words and as row ids of the embedding matrices)
+            self.src_index = registry.index(src_embed)
+            self.trg_index = registry.index(trg_embed)
+            self.shared_vocab, self.src_rows, self.trg_rows = self.get_vocab(vocab_file, dictionary)
+            self.shared_vocab_src, self.shared_vocab_trg = zip(*self.shared_vocab)
 
-        # get shared vocab
-        self.shared_vocab = self.get_vocab(vocab_file, dictionary)
-        self.shared_vocab_src, self.shared_vocab_trg = zip(*self.shared_vocab)
+            # shared vocab matrices are extracted once, mapping and scoring only operate on these
+            self.src_shared = self.cast(self.model_src.vectors[self.src_rows])
+            self.trg_shared = self.cast(self.model_trg.vectors[self.trg_rows])
+            record.update(src_shape=shape(self.src_shared), trg_shape=shape(self.trg_shared))
+        # mapped shared vocab matrices (set by map_spaces)
+        self.src_mapped = None
+        self.trg_mapped = None
+        # streamed statistics of the shared vocab matrices (see get_statistics)
+        self.stats = None
+        # procrustes solution of the shared vocab matrices (see get_procrustes)
+        self.procrustes = None
+        # block moments of the shared vocab matrices for resampling (see get_significance)
+        self.moments = None
+        # algorithm and transform matrices of the last mapping (set by map_spaces)
+        self.algorithm = None
+        self.mapping = {}
 
     def get_vocab(self, vocab_file, dictionary):
-        shared_vocab = []
-        src_trg = defaultdict(set)
-        trg_src = defaultdict(set)
-
+        """
+        Load the shared vocabulary from vocab_file or extract it (and store it in vocab_file)
+        :param vocab_file: file for loading/saving the shared vocabulary
+        :param dictionary: dictionary for extracting shared vocabulary in cross-lingual comparison
+        :return: list of shared (source, target) word pairs, their row ids in the source and target space
+        """
         if os.path.isfile(vocab_file):
             # load shared vocab (already shuffled)
             logging.debug("Loading shared vocabulary")
             with open(vocab_file, "r", encoding="utf-8") as vf:
-                for line in vf:
-                    pair = line.strip().split()
-                    src_trg[pair[0]].add(pair[1])
-                    trg_src[pair[1]].add(pair[0])
-                    shared_vocab.append(tuple(pair))
+                shared_vocab = [tuple(line.strip().split()) for line in vf]
+            src_words, trg_words = (as_words(words) for words in zip(*shared_vocab))
+            src_rows = self.src_index.lookup(src_words)
+            trg_rows = self.trg_index.lookup(trg_words)
+            unknown = np.concatenate([src_words[src_rows < 0], trg_words[trg_rows < 0]])
+            if len(unknown):
+                raise KeyError("word '{}' of {} not in vocabulary".format(unknown[0], vocab_file))
         else:
             # get shared vocabulary and store it in file for reproducibility
             if dictionary:
-                logging.debug("Extracting translations")
-                translations = set()
-                with open(dictionary) as d:
-                    for line in d:
-                        pair = line.strip().split()
-                        translations.add((pair[0], pair[1]))
-                        src_trg[pair[0]].add(pair[1])
-                        trg_src[pair[1]].add(pair[0])
+                src_words, trg_words = load_dictionary(dictionary)
                 logging.debug("Extracting shared bilingual vocabulary")
-                shared_vocab = [pair for pair in translations if
-                                     pair[0] in self.model_src.vocab and pair[1] in self.model_trg.vocab]
+                src_rows = self.src_index.lookup(src_words)
+                trg_rows = self.trg_index.lookup(trg_words)
+                known = (src_rows >= 0) & (trg_rows >= 0)
+                src_rows, trg_rows = src_rows[known], trg_rows[known]
             else:
                 logging.debug("Extracting shared monolingual vocabulary")
-                shared_vocab = [(token, token) for token in self.model_src.vocab if
-                                                       token in self.model_trg.vocab]
+                src_rows, trg_rows = self.src_index.intersect(self.trg_index)
 
             # save shuffled shared vocabulary
-            random.shuffle(shared_vocab)
+            order = list(range(len(src_rows)))
+            random.shuffle(order)
+            src_rows, trg_rows = src_rows[order], trg_rows[order]
+            shared_vocab = list(zip((self.model_src.index2word[row] for row in src_rows),
+                                    (self.model_trg.index2word[row] for row in trg_rows)))
             with open(vocab_file, "w", encoding="utf-8") as vf:
                 for entry in shared_vocab:
                     vf.write("{} {}\n".format(entry[0], entry[1]))
 
-        return shared_vocab
+        return shared_vocab, src_rows, trg_rows
 
     def map_spaces(self, algo, src_mapped_embed=None, trg_mapped_embed=None):
+        """
+        Map the shared vocab matrices of both spaces with the given algorithm.
+        The complete embedding spaces are only transformed if the mapped embeddings are requested,
+        otherwise the mapping only operates on the shared vocabulary ("measure-only" mode)
+        :param algo: procrustes, noise, cca or gcca
+        :param src_mapped_embed: file name for saving the mapped source space (in directory algo)
+        :param trg_mapped_embed: file name for saving the mapped target space (in directory algo)
+        """
 
         # (There may be duplicates in self.shared_vocab_src and/or self.shared_vocab_trg,
         # swap_vocab can be used to only inspect one-to-one translations)
-        src_embed = self.model_src[self.shared_vocab_src]
-        trg_embed = self.model_trg[self.shared_vocab_trg]
+        src_embed = self.src_shared
+        trg_embed = self.trg_shared
+
+        self.algorithm = algo
+        with self.instrumentation.stage("fit", algorithm=algo, shape=shape(src_embed)) as record:
+            self.mapping, transform_src, transform_trg, clean_indices = self.fit_mapping(algo, record)
+            if clean_indices is not None:
+                #write cleaned vocab to file
+                with open("vocab.clean.txt", 'w') as v:
+                    for src, trg in np.asarray(self.shared_vocab)[clean_indices]:
+                        v.write("{}\t{}\n".format(src, trg))
 
-        os.makedirs(algo, exist_ok=True)
+        # the complete spaces are only transformed if they are saved
+        with self.instrumentation.stage("transform", algorithm=algo) as record:
+            self.src_mapped = transform_src(src_embed) if transform_src else src_embed
+            self.trg_mapped = transform_trg(trg_embed) if transform_trg else trg_embed
+            src_vectors = transform_src(self.model_src.vectors) if src_mapped_embed and transform_src else None
+            trg_vectors = transform_trg(self.model_trg.vectors) if trg_mapped_embed and transform_trg else None
+            record.update(shapes=[shape(matrix) for matrix in (self.src_mapped, self.trg_mapped, src_vectors,
+                                                               trg_vectors) if matrix is not None])
 
+        # save transformed model(s) (as copies, so that further mappings still start from the original spaces)
+        if src_mapped_embed or trg_mapped_embed:
+            with self.instrumentation.stage("save", algorithm=algo):
+                os.makedirs(algo, exist_ok=True)
+                if src_mapped_embed:
+                    model = copy.copy(self.model_src)
+                    if src_vectors is not None:
+                        model.vectors = src_vectors
+                    model.save(os.path.join(algo, src_mapped_embed))
+                if trg_mapped_embed:
+                    model = copy.copy(self.model_trg)
+                    if trg_vectors is not None:
+                        model.vectors = trg_vectors
+                    model.save(os.path.join(algo, trg_mapped_embed))
+
+    def fit_mapping(self, algo, record=None):
+        """
+        Fit a mapping of the shared vocab matrices without transforming them (the instance is not changed)
+        :param algo: procrustes, noise, cca or gcca
+        :param record: instrumentation record for further information about the fit (e.g. EM iterations)
+        :return: transform matrices (dict), transformations of the source and target space (None: the space is not
+        transformed), clean indices of the shared vocabulary (noise aware alignment only, else None)
+        """
+        record = record if record is not None else {}
+        src_embed = self.src_shared
+        trg_embed = self.trg_shared
+        clean_indices = None
         if algo == "procrustes":
             logging.info("Calculating Rotation Matrix (Procrustes Problem) and applying it to first embedding")
-            #ortho, _ = orthogonal_procrustes(src_embed, trg_embed)
-            # does the same as
-            u, _, vt = np.linalg.svd(trg_embed.T.dot(src_embed))
-            w = vt.T.dot(u.T)
-            self.model_src.vectors.dot(w, out=self.model_src.vectors)
+            mapping = {"w": self.get_procrustes()}
+            w = self.cast(mapping["w"])
+            transform_src, transform_trg = (lambda view: view.dot(w)), None
 
         elif algo == "noise":
             logging.info("Calculating Rotation Matrix with noise aware algorithm and applying it to first embedding")
-            transform_matrix, alpha, clean_indices, noisy_indices = noise_aware(src_embed,trg_embed)
-            #write cleaned vocab to file
-            with open("vocab.clean.txt", 'w') as v:
-                for src, trg in np.asarray(self.shared_vocab)[clean_indices]:
-                    v.write("{}\t{}\n".format(src, trg))
-            self.model_src.vectors.dot(transform_matrix, out=self.model_src.vectors)
+            # EM is initialized with the procrustes solution
+            history = []
+            transform_matrix, alpha, clean_indices, noisy_indices = noise_aware(
+                src_embed, trg_embed, Q_start=self.cast(self.get_procrustes()), history=history)
+            mapping = {"Q": transform_matrix, "alpha": alpha}
+            Q = self.cast(transform_matrix)
+            transform_src, transform_trg = (lambda view: view.dot(Q)), None
+            # EM only stops when alpha has converged
+            record.update(em_iterations=len(history), em_delta_alpha=history[-1]["delta_alpha"] if history else None,
+                          alpha=float(alpha), clean=len(clean_indices))
             logging.info("Percentage of clean indices: {}".format(alpha))
 
         elif algo == "cca":
             logging.info("Calculating Mapping based on CCA and applying it to both embeddings")
-            cca = CCA(n_components=100, max_iter=5000)
-            cca.fit(src_embed, trg_embed)
-            self.model_src.vectors, self.model_trg.vectors = cca.transform(self.model_src.vectors, self.model_trg.vectors)
+            # direct solver on the statistics of the shared vocab matrices (instead of sklearn's iterative CCA)
+            cca = CCA(dtype=self.dtype)
+            cca.fit_stats(self.get_statistics())
+            mapping = {"x_rotations": cca.x_rotations_, "y_rotations": cca.y_rotations_,
+                       "x_mean": cca.x_mean_, "y_mean": cca.y_mean_}
+            transform_src, transform_trg = (lambda view: cca.transform_view(view, 0)), \
+                (lambda view: cca.transform_view(view, 1))
 
         elif algo == "gcca":
             logging.info("Calculating Mapping based on GCCA and applying it to both embeddings")
-            gcca = GCCA()
-            gcca.fit([src_embed, trg_embed])
-            transform_l = gcca.transform_as_list((self.model_src.vectors, self.model_trg.vectors))
-            # gcca computes positive and negative correlations (eigenvalues), sorted in ascending order.
-            # We are only interested in the positive portion
-            self.model_src.vectors = transform_l[0][:,100:]
-            self.model_trg.vectors = transform_l[1][:,100:]
-
-        # save transformed model(s)
-        if src_mapped_embed:
-            self.model_src.save(os.path.join(algo, src_mapped_embed))
-        if trg_mapped_embed:
-            self.model_trg.save(os.path.join(algo, trg_mapped_embed))
+            gcca = GCCA(dtype=self.dtype)
+            gcca.fit_stats(self.get_statistics())
+            mapping = {"theta": gcca.theta, "mean": gcca.mean}
+            # gcca only computes the positive correlations (eigenvalues), sorted in ascending order
+            transform_src, transform_trg = (lambda view: gcca.transform_view(view, 0)), \
+                (lambda view: gcca.transform_view(view, 1))
+
+        else:
+            raise ValueError("Unknown mapping algorithm '{}'".format(algo))
+        return mapping, transform_src, transform_trg, clean_indices
+
+    def cast(self, array):
+        """
+        :return: array in the compute precision (not copied if it already has this dtype)
+        """
+        return array if self.dtype is None else array.astype(self.dtype, copy=False)
+
+    def get_procrustes(self):
+        """
+        Orthogonal mapping of the source onto the target shared vocab matrix (solution of the procrustes problem),
+        computed once from the cross-product in the statistics of the shared vocab matrices
+        :return: rotation matrix w (src_shared.dot(w) ~ trg_shared)
+        """
+        if self.procrustes is None:
+            #ortho, _ = orthogonal_procrustes(src_embed, trg_embed)
+            # does the same as
+            u, _, vt = np.linalg.svd(self.get_statistics().cross_product(1, 0))
+            self.procrustes = vt.T.dot(u.T)
+        return self.procrustes
+
+    def get_statistics(self):
+        """
+        Mean and covariance of the (unmapped) shared vocab matrices, accumulated over chunks of rows.
+        Further vocabulary can be added with self.stats.update([src_rows, trg_rows])
+        :return: CovarianceAccumulator
+        """
+        if self.stats is None:
+            self.stats = accumulate([self.src_shared, self.trg_shared])
+        return self.stats
 
     def get_embedding_correlations(self):
+        """
+        Dimension-wise correlations of the shared vocab matrices (after mapping, if the spaces were mapped)
+        :return: correlation per dimension
+        """
         logging.debug("Calculating correlation matrix")
-        src = self.model_src[self.shared_vocab_src]
-        trg = self.model_trg[self.shared_vocab_trg]
-
-        corr_matrix = np.corrcoef(src, trg, rowvar=False)
-        # corr_matrix is 2*dim x 2*dim matrix, we are only interested in the corr between different embeddings,
-        # i.e. upper right or lower left dim x dim matrix (they are the same, so we just pick one here)
-        corr_matrix = corr_matrix[100:, :100]
-
-        # d_frobenius_corrcoef = norm(corr_matrix) # how to interpret results?
-        # rather inspect diagonal (dimension wise correlations)
-        diag = np.diag(corr_matrix)
-        return diag
\ No newline at end of file
+        with self.instrumentation.stage("score", algorithm=self.algorithm) as record:
+            if self.src_mapped is None and self.trg_mapped is None:
+                stats = self.get_statistics()
+            else:
+                src = self.src_shared if self.src_mapped is None else self.src_mapped
+                trg = self.trg_shared if self.trg_mapped is None else self.trg_mapped
+                stats = accumulate([src, trg])
+
+            # we are only interested in the correlation between different embeddings (the off-diagonal block of the
+            # correlation matrix), or rather its diagonal (dimension wise correlations)
+            # d_frobenius_corrcoef = norm(corr_matrix) # how to interpret results?
+            corr = stats.correlations(0, 1)
+            record["cca_measure"] = float(np.mean(corr))
+        return corr
+
+    def get_canonical_correlations(self, mapping=None):
+        """
+        Dimension-wise correlations after mapping the spaces with GCCA, computed directly from the covariance
+        matrices of the shared vocab matrices (a single small eigenproblem, the spaces are not transformed)
+        :param mapping: dict that the gcca transform (theta and mean, as in map_spaces) is added to, e.g. for
+        caching (only the correlations are computed if None)
+        :return: canonical correlations in ascending order (as get_embedding_correlations after map_spaces("gcca"))
+        """
+        logging.debug("Calculating canonical correlations")
+        with self.instrumentation.stage("score", algorithm="gcca", closed_form=True) as record:
+            stats = self.get_statistics()
+            if mapping is None:
+                corr = canonical_correlations(stats.block(0, 0), stats.block(1, 1), stats.block(0, 1),
+                                              min(stats.dims))[::-1]
+            else:
+                # the directions come from the same svd of the whitened cross-covariance
+                gcca = GCCA(dtype=self.dtype)
+                gcca.fit_stats(stats)
+                mapping.update(theta=gcca.theta, mean=gcca.mean)
+                corr = gcca.eigvals
+            record["cca_measure"] = float(np.mean(corr))
+        return corr
+
+    def get_neighbour_overlap(self, k=10):
+        """
+        Neighbourhood overlap of the shared vocabulary: portion of the k nearest neighbours (cosine similarity in
+        the complete spaces) of every shared word that are also among the k nearest neighbours of its
+        counterpart in the other space. The neighbourhoods do not depend on a mapping of the spaces, and the
+        neighbours of every space are computed once by the registry and reused for all comparisons with it
+        :param k: number of neighbours
+        :return: overlap per shared word (the measure is its mean)
+        """
+        logging.debug("Calculating neighbourhood overlap")
+        with self.instrumentation.stage("score", measure="neighbours", k=k) as record:
+            overlap = neighbour_overlap(self.registry.neighbours(self.src_embed, self.src_rows, k),
+                                        self.registry.neighbours(self.trg_embed, self.trg_rows, k),
+                                        self.src_rows, self.trg_rows, len(self.src_index), len(self.trg_index))
+            record["neighbour_overlap"] = float(np.mean(overlap))
+        return overlap
+
+    def compare_algorithms(self, algorithms, mappings=None):
+        """
+        Dimension-wise correlations after mapping the shared vocab matrices with each of the given algorithms,
+        all evaluated on the same loaded spaces and sharing the statistics of the shared vocab matrices
+        (and procrustes and noise the same procrustes solution). The correlations are computed from the
+        covariance blocks without transforming the matrices, and the mappings are not stored on the instance
+        (mapping, src_mapped and trg_mapped are left unchanged, no vocab.clean.txt is written).
+        :param algorithms: list of mapping algorithms (see map_spaces)
+        :param mappings: dict that the transform matrices of every fitted algorithm are added to (e.g. for caching)
+        :return: dict of correlations per algorithm (None for the unmapped spaces), in the order of algorithms
+        """
+        stats = self.get_statistics()
+        results = {None: stats.correlations(0, 1)}
+        for algo in algorithms:
+            logging.info("Comparing spaces mapped with {}".format(algo))
+            if algo == "gcca":
+                mapping = {}
+                results[algo] = self.get_canonical_correlations(mapping)
+            elif algo in ("procrustes", "noise", "cca"):
+                # the mapping is only fitted, the shared vocab matrices are not transformed
+                with self.instrumentation.stage("fit", algorithm=algo, shape=shape(self.src_shared)) as record:
+                    mapping = self.fit_mapping(algo, record)[0]
+                with self.instrumentation.stage("score", algorithm=algo, closed_form=True) as record:
+                    if algo == "procrustes":
+                        results[algo] = stats.mapped_correlations(mapping["w"], None)
+                    elif algo == "noise":
+                        results[algo] = stats.mapped_correlations(mapping["Q"], None)
+                    else:
+                        results[algo] = stats.mapped_correlations(mapping["x_rotations"], mapping["y_rotations"])
+                    record["cca_measure"] = float(np.mean(results[algo]))
+            else:
+                raise ValueError("Unknown mapping algorithm '{}'".format(algo))
+            if mappings is not None:
+                mappings[algo] = mapping
+        return results
+
+    def get_significance(self, statistic="gcca", n_resamples=1000, n_permutations=1000, alpha=0.05, n_blocks=100,
+                         seed=0, workers=4):
+        """
+        Confidence interval (block bootstrap over the shared vocabulary) and p-value (permutation of the
+        target rows) of the CCA measure, computed from the unmapped shared vocab matrices
+        :param statistic: "gcca" for the measure after gcca mapping, None for the measure of the unmapped spaces
+        :param n_resamples: number of bootstrap replicates (no confidence interval if 0)
+        :param n_permutations: number of permutations (no p-value if 0)
+        :param alpha: 1 - confidence level
+        :param n_blocks: number of blocks of shared vocabulary rows that are resampled
+        :param seed: random seed
+        :param workers: number of threads
+        :return: Significance(measure, ci_low, ci_high, p_value)
+        """
+        if self.moments is None or len(self.moments) != min(n_blocks, len(self.src_shared)):
+            self.moments = BlockMoments(self.src_shared, self.trg_shared, n_blocks)
+        return significance(self.src_shared, self.trg_shared, statistic, n_resamples, n_permutations, alpha,
+                            seed=seed, workers=workers, moments=self.moments)
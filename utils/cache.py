@@ -0,0 +1,141 @@
+# Persistent cache of fitted mappings and dimension-wise correlations
+
+import os
+import glob
+import fcntl
+import json
+import hashlib
+import logging
+import tempfile
+import numpy as np
+
+# read files in blocks of 16 MB for hashing
+BLOCK_SIZE = 1 << 24
+
+
+def file_hash(path):
+    """
+    SHA-1 of a file, including the arrays gensim stores in separate .npy files next to it
+    :param path: file path
+    :return: hex digest
+    """
+    sha = hashlib.sha1()
+    for file in [path] + sorted(glob.glob(glob.escape(path) + ".*.npy")):
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache keyed by the hashes of the source embedding, target embedding,
+    shared vocabulary file and algorithm. Entries are .npz files containing the small transform matrices
+    (e.g. procrustes w, gcca theta/mean, noise aware Q) and the dimension-wise correlations.
+    The least recently used entries are evicted when the cache grows beyond max_size bytes.
+    """
+    def __init__(self, cache_dir, max_size=1 << 30):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+        # file hashes are remembered by path, size and modification time
+        self.hash_file = os.path.join(self.cache_dir, "hashes.json")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _read_hashes(self):
+        if not os.path.isfile(self.hash_file):
+            return {}
+        with open(self.hash_file) as hf:
+            return json.load(hf)
+
+    def _file_hash(self, path):
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        stamp = "{}:{}".format(stat.st_size, stat.st_mtime_ns)
+        entry = self._read_hashes().get(path, {})
+        if entry.get("stamp") == stamp:
+            return entry["sha1"]
+        # hashed outside of the lock, so that processes hashing other files do not wait for each other
+        logging.debug("Hashing {}".format(path))
+        sha1 = file_hash(path)
+        # read-modify-write of hashes.json under an exclusive lock of a separate lock file
+        # (hashes.json itself is replaced on every write), so concurrent processes do not drop each other's hashes
+        with open(self.hash_file + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                hashes = self._read_hashes()
+                hashes[path] = {"stamp": stamp, "sha1": sha1}
+                self._write_atomic(self.hash_file, json.dumps(hashes).encode("utf-8"))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return sha1
+
+    def key(self, src_embed, trg_embed, vocab_file, algorithm):
+        """
+        :param src_embed: path to source embedding
+        :param trg_embed: path to target embedding
+        :param vocab_file: path to shared vocabulary file
+        :param algorithm: mapping algorithm (None for unmapped spaces)
+        :return: cache key
+        """
+        parts = [self._file_hash(src_embed), self._file_hash(trg_embed), self._file_hash(vocab_file), str(algorithm)]
+        return hashlib.sha1(" ".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: dict of cached arrays or None
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                result = dict(entry)
+        except (IOError, ValueError):
+            return None
+        # mark entry as recently used
+        os.utime(path)
+        logging.debug("Cache hit {}".format(key))
+        return result
+
+    def put(self, key, **arrays):
+        """
+        Store arrays (e.g. corr=..., w=...) under the given key
+        :param key: cache key
+        """
+        arrays = {name: array for name, array in arrays.items() if array is not None}
+        with tempfile.TemporaryFile() as tmp:
+            np.savez(tmp, **arrays)
+            tmp.seek(0)
+            self._write_atomic(self._path(key), tmp.read())
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache is smaller than max_size
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            logging.debug("Evicting {}".format(path))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+    def _write_atomic(self, path, data):
+        # concurrent processes only ever see complete files
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
@@ -0,0 +1,74 @@
+# Direct CCA solver (whitening and SVD of the cross-covariance) with the fit/transform interface
+# of sklearn.cross_decomposition.CCA, which solves the same problem iteratively (NIPALS)
+
+import numpy as np
+from utils.gcca import canonical_directions
+from utils.statistics import accumulate, CHUNK_SIZE
+
+
+class CCA:
+    def __init__(self, n_components=None, reg=0.0, dtype=None):
+        """
+        :param n_components: number of canonical directions, defaults to the smallest view dimension
+        :param reg: ridge regularization added to the diagonals of the covariance matrices
+        :param dtype: dtype of the rotations and transformed views (e.g. np.float32),
+        None for the result type of the views and the (float64) rotations
+        """
+        self.n_components = n_components
+        self.reg = reg
+        self.dtype = dtype
+
+    def fit(self, X, Y, chunk_size=CHUNK_SIZE):
+        """
+        :param X: first view (rows are samples)
+        :param Y: second view
+        :param chunk_size: number of rows processed at once (statistics are accumulated in float64,
+        so float32 views are never copied completely)
+        :return: self
+        """
+        return self.fit_stats(accumulate([X, Y], chunk_size))
+
+    def fit_stats(self, stats):
+        """
+        Fit the canonical directions given the (streamed) statistics of the two views
+        :param stats: CovarianceAccumulator of the views
+        :return: self
+        """
+        d = stats.dims[0]
+        cov = stats.cov()
+        ridge = self.reg * np.eye(len(cov))
+        k = self.n_components or min(stats.dims)
+        corr, x_rotations, y_rotations = canonical_directions(cov[:d, :d] + ridge[:d, :d], cov[d:, d:] + ridge[d:, d:],
+                                                              cov[:d, d:], k)
+        # canonical correlations (descending) and rotations of the centered views (not of standardized views as
+        # in sklearn, the transformed views have unit variance)
+        self.correlations_ = corr
+        self.x_mean_, self.y_mean_ = stats.mean[:d], stats.mean[d:]
+        self.x_rotations_, self.y_rotations_ = x_rotations, y_rotations
+        return self
+
+    def _transform(self, view, mean, rotations):
+        if self.dtype is not None:
+            mean, rotations = mean.astype(self.dtype), rotations.astype(self.dtype)
+        return (view - mean).dot(rotations)
+
+    def transform_view(self, view, i):
+        """
+        Transform a single view
+        :param view: first (i=0) or second (i=1) view
+        :return: transformed view
+        """
+        if i == 0:
+            return self._transform(view, self.x_mean_, self.x_rotations_)
+        return self._transform(view, self.y_mean_, self.y_rotations_)
+
+    def transform(self, X, Y=None):
+        """
+        :param X: first view
+        :param Y: second view (optional)
+        :return: transformed X (and Y)
+        """
+        x_scores = self.transform_view(X, 0)
+        if Y is None:
+            return x_scores
+        return x_scores, self.transform_view(Y, 1)
@@ -0,0 +1,108 @@
+# Shared in-memory registry of pre-trained embedding spaces
+
+import os
+import logging
+import numpy as np
+from utils.vocab_index import VocabIndex
+from utils.neighbours import top_k
+
+
+class EmbeddingRegistry:
+    """
+    Loads every embedding space only once and hands out the cached model on subsequent requests
+    """
+    def __init__(self, mmap=None, dtype=None):
+        """
+        :param mmap: memory map the vectors of the raw spaces ('r' for read-only) instead of reading them into RAM.
+        (only possible for vectors stored in a separate .npy file by gensim, i.e. for larger spaces)
+        :param dtype: convert the vectors to this dtype (e.g. np.float32) if they are stored with another precision
+        (the converted vectors are read into RAM), None keeps the stored dtype
+        """
+        self.mmap = mmap
+        self.dtype = dtype
+        self.models = {}
+        self.indices = {}
+        # nearest neighbours per space and k (-1 for rows that have not been queried yet)
+        self.neighbour_tables = {}
+
+    def get(self, embed, norm=False):
+        """
+        Return the (cached) embedding space stored at the given path
+        :param embed: path to pre-trained embedding space
+        :param norm: whether to return l2 normalized vectors
+        :return: KeyedVectors
+        """
+        key = (os.path.abspath(embed), norm)
+        if key not in self.models:
+            logging.debug("Loading embeddings {}".format(embed))
+            # gensim is only imported when a space is actually loaded (e.g. not for cached comparisons)
+            from gensim.models.keyedvectors import KeyedVectors
+            model = KeyedVectors.load(embed, mmap=self.mmap)
+            if self.dtype is not None and model.vectors.dtype != self.dtype:
+                model.vectors = model.vectors.astype(self.dtype)
+            if norm:
+                # create l2 normalized vectors in a new array (the raw vectors may be a read-only memory map)
+                model.vectors = model.vectors / np.linalg.norm(model.vectors, axis=1, keepdims=True)
+                model.vectors_norm = model.vectors
+            self.models[key] = model
+        return self.models[key]
+
+    def index(self, embed):
+        """
+        Return the (cached) vocabulary index of the embedding space stored at the given path
+        :param embed: path to pre-trained embedding space
+        :return: VocabIndex
+        """
+        key = os.path.abspath(embed)
+        if key not in self.indices:
+            self.indices[key] = VocabIndex(self.cached(embed).index2word)
+        return self.indices[key]
+
+    def cached(self, embed):
+        """
+        Return a cached model of the embedding space stored at the given path (raw or l2 normalized, whichever
+        has been loaded), so that vocabulary lookups never load a further copy of the space
+        :param embed: path to pre-trained embedding space
+        :return: KeyedVectors
+        """
+        for norm in (False, True):
+            model = self.models.get((os.path.abspath(embed), norm))
+            if model is not None:
+                return model
+        return self.get(embed)
+
+    def neighbours(self, embed, rows, k=10):
+        """
+        Return the k nearest neighbours (cosine similarity) of the given words of the embedding space stored at the
+        given path. Neighbours are only computed for rows that have not been queried before, so they are computed
+        once per space and reused across all comparisons with it
+        :param embed: path to pre-trained embedding space
+        :param rows: row ids of the query words
+        :param k: number of neighbours
+        :return: row ids of the neighbours (len(rows) x k, most similar first)
+        """
+        key = (os.path.abspath(embed), k)
+        # top_k normalizes the vectors block-wise, so no normalized copy of the space is needed
+        vectors = self.cached(embed).vectors
+        if key not in self.neighbour_tables:
+            self.neighbour_tables[key] = np.full((len(vectors), k), -1, dtype=np.int32)
+        table = self.neighbour_tables[key]
+        missing = np.unique(rows[table[rows, 0] < 0])
+        if len(missing):
+            logging.debug("Computing {} nearest neighbours of {} words of {}".format(k, len(missing), embed))
+            table[missing] = top_k(vectors, missing, k)
+        return table[rows]
+
+    def preload(self, embeddings, norm=False):
+        """
+        Load all given embedding spaces and build their vocabulary indices (e.g. before sharing the registry
+        with worker processes, which would otherwise sort every vocabulary again after the fork)
+        :param embeddings: paths to pre-trained embedding spaces
+        :param norm: whether to load l2 normalized vectors
+        """
+        for embed in embeddings:
+            self.get(embed, norm=norm)
+            self.index(embed)
+
+    def __len__(self):
+        return len(self.models)
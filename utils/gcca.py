@@ -3,34 +3,111 @@
 
 import numpy as np
 import scipy.linalg as linalg
+from utils.statistics import accumulate, CHUNK_SIZE
+
+
+def inv_sqrt(cov):
+    """
+    Inverse square root of a symmetric positive (semi-)definite matrix (used for whitening)
+    :param cov: covariance matrix
+    :return: cov^(-1/2)
+    """
+    eigvals, eigvecs = linalg.eigh(cov)
+    # guard against (numerically) singular covariance matrices
+    eigvals = np.maximum(eigvals, eigvals.max() * len(eigvals) * np.finfo(float).eps)
+    return (eigvecs / np.sqrt(eigvals)).dot(eigvecs.T)
+
+
+def canonical_directions(cov_xx, cov_yy, cov_xy, k):
+    """
+    Top-k canonical correlations and directions of two views via the SVD of the whitened cross-covariance
+    :param cov_xx: covariance matrix of the first view
+    :param cov_yy: covariance matrix of the second view
+    :param cov_xy: cross-covariance matrix
+    :param k: number of canonical directions
+    :return: correlations (descending), directions of the first view, directions of the second view
+    """
+    w_x = inv_sqrt(cov_xx)
+    w_y = inv_sqrt(cov_yy)
+    u, s, vt = linalg.svd(w_x.dot(cov_xy).dot(w_y))
+    return s[:k], w_x.dot(u[:, :k]), w_y.dot(vt[:k].T)
+
+
+def canonical_correlations(cov_xx, cov_yy, cov_xy, k):
+    """
+    Top-k canonical correlations of two views (singular values of the whitened cross-covariance)
+    :param cov_xx: covariance matrix of the first view
+    :param cov_yy: covariance matrix of the second view
+    :param cov_xy: cross-covariance matrix
+    :param k: number of canonical correlations
+    :return: correlations (descending)
+    """
+    return linalg.svd(inv_sqrt(cov_xx).dot(cov_xy).dot(inv_sqrt(cov_yy)), compute_uv=False)[:k]
+
 
 class GCCA:
-    def __init__(self):
-        pass
+    def __init__(self, n_components=None, dtype=None):
+        """
+        :param n_components: number of (positive) canonical directions, defaults to the smallest view dimension
+        :param dtype: dtype of the transformed views (e.g. np.float32), None for the result type of the views
+        and the (float64) canonical directions
+        """
+        self.n_components = n_components
+        self.dtype = dtype
 
-    def fit(self, views):
-        dims = [view.shape[1] for view in views]
-        concat = np.concatenate(views, axis = 1)
-        self.mean = concat.mean(axis = 0)
-        cov = np.cov(concat.T)
+    def fit(self, views, chunk_size=CHUNK_SIZE):
+        # covariance is accumulated over chunks of rows instead of concatenating the complete views
+        self.fit_stats(accumulate(views, chunk_size))
 
-        mask = linalg.block_diag(*[np.ones((dim, dim), bool) for dim in dims])
+    def fit_stats(self, stats):
+        """
+        Fit the canonical directions given the (streamed) statistics of the views
+        :param stats: CovarianceAccumulator of the views
+        """
+        self.mean = stats.mean
+        self.fit_cov(stats.cov(), stats.dims)
 
-        eigvals, eigvecs = linalg.eigh(cov * np.invert(mask), cov * mask)
-        tol = abs(eigvals.real).max() * len(eigvals) * np.finfo(float).eps
+    def fit_cov(self, cov, dims):
+        """
+        Fit the canonical directions given the covariance matrix of the concatenated views.
+        Only the top k positive eigenpairs are kept, which are stored in ascending order
+        (for two views the eigenvalues are the canonical correlations). The decompositions are still full
+        (svd of the d x d whitened cross-covariance, or eigh of the N*d x N*d pencil that only returns the top k),
+        so the cost does not depend on k: truncated ARPACK solvers (svds/eigsh) were several times slower
+        on the clustered spectra of embedding covariances
+        :param cov: covariance matrix of the concatenated views
+        :param dims: dimensions of the views
+        """
+        self.dims = dims
+        k = self.n_components or min(dims)
 
-        self.theta = eigvecs.real[:, np.greater(abs(eigvals.real), tol)]
+        if len(dims) == 2:
+            # the generalized eigenproblem of two views reduces to the SVD of the whitened cross-covariance
+            d = dims[0]
+            s, a, b = canonical_directions(cov[:d, :d], cov[d:, d:], cov[:d, d:], k)
+            # scale as the solution of the generalized eigenproblem (theta.T * cov * mask * theta = I)
+            self.eigvals = s[::-1]
+            self.theta = np.concatenate([a, b])[:, ::-1] / np.sqrt(2)
+        else:
+            mask = linalg.block_diag(*[np.ones((dim, dim), bool) for dim in dims])
+            n = sum(dims)
+            eigvals, eigvecs = linalg.eigh(cov * np.invert(mask), cov * mask, subset_by_index=[n - k, n - 1])
+            self.eigvals = eigvals
+            self.theta = eigvecs
     
     def transform(self, views):
         concat = np.concatenate(views, axis = 1)
-        return (concat - self.mean).dot(self.theta)
+        mean, theta = self._cast(self.mean), self._cast(self.theta)
+        return (concat - mean).dot(theta)
+
+    def _cast(self, array):
+        return array if self.dtype is None else array.astype(self.dtype)
 
     def transform_as_list(self, views):
-        dims = [view.shape[1] for view in views]
-        outputs = []
-
-        slc = slice(0,0)
-        for i, dim in enumerate(dims):
-            slc = slice(slc.stop, slc.stop + dim)
-            outputs.append((views[i] - self.mean[slc]).dot(self.theta[slc]))
-        return outputs
+        return [self.transform_view(view, i) for i, view in enumerate(views)]
+
+    def transform_view(self, view, i):
+        # transform a single view (the i-th view passed to fit)
+        start = sum(self.dims[:i])
+        slc = slice(start, start + self.dims[i])
+        return (view - self._cast(self.mean[slc])).dot(self._cast(self.theta[slc]))
@@ -0,0 +1,87 @@
+# Structured timing and memory records of the stages of a comparison (written as json lines)
+
+import os
+import sys
+import json
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """
+    :return: peak resident set size of the process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def rss_mb():
+    """
+    :return: current resident set size of the process in MB (None if /proc/self/statm is not available)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident = int(statm.read().split()[1])
+    except (IOError, IndexError, ValueError):
+        return None
+    return resident * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class Instrumentation:
+    """
+    Records wall time, memory and further information (e.g. matrix shapes, EM iterations) of every stage
+    and appends them as json lines to a file, if given. The peak RSS of a process never decreases,
+    so every stage records by how much it raised the peak (0 if an earlier stage needed more memory)
+    and the RSS after the stage
+    """
+    def __init__(self, path=None, **context):
+        """
+        :param path: json lines file the records are appended to (records are only kept in memory if None)
+        :param context: information added to every record (e.g. the compared spaces)
+        """
+        self.path = path
+        self.context = context
+        self.records = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Measure a stage, further information can be added to the yielded record.
+        The record is also emitted if the stage raises (marked as failed, with the error)
+        :param name: name of the stage (load, vocab, fit, transform, save, score)
+        :param info: information about the stage
+        """
+        record = dict(self.context, stage=name, **info)
+        start = time.perf_counter()
+        peak_before = peak_rss_mb()
+        record["failed"] = True
+        try:
+            yield record
+            record["failed"] = False
+        except BaseException as e:
+            record["error"] = "{}: {}".format(type(e).__name__, e)
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["rss_peak_growth_mb"] = peak_rss_mb() - peak_before
+            record["rss_mb"] = rss_mb()
+            self.emit(record)
+
+    def emit(self, record):
+        logging.debug("Stage {stage} {status} after {seconds:.3f}s".format(
+            status="failed" if record.get("failed") else "finished", **record))
+        with self.lock:
+            self.records.append(record)
+            if self.path:
+                with open(self.path, "a") as out:
+                    out.write(json.dumps(record, default=str) + "\n")
+
+
+def shape(array):
+    # shapes as lists for json
+    return list(array.shape)
@@ -0,0 +1,128 @@
+# Joint comparison of several embedding spaces with a single multi-view GCCA
+
+import os
+import copy
+import logging
+import random
+import numpy as np
+from utils.gcca import GCCA
+from utils.embeddings import EmbeddingRegistry
+from utils.statistics import accumulate
+from utils.vocab_index import shared_rows
+from utils.instrumentation import Instrumentation, shape
+
+
+class MultiSpaceTests:
+    """
+    Loads N embedding spaces, extracts the vocabulary shared by all of them and maps them into one jointly aligned
+    space with an N-view GCCA. All pairwise dimension-wise correlations are read off the joint covariance matrix,
+    so a single eigenproblem replaces the N x N two-view comparisons of similarity_matrix. (The joint directions
+    are a compromise between all spaces, i.e. the pairwise correlations are lower than those of two-view GCCA,
+    and the shared vocabulary is smaller than for each pair)
+    """
+    def __init__(self, embeds, vocab_file, norm=False, registry=None, mmap=None, dtype=None, instrumentation=None):
+        """
+        :param embeds: paths to pre-trained embedding spaces
+        :param vocab_file: file for loading/saving the shared vocabulary (one word per line)
+        :param norm: whether to use l2 normalized vectors
+        :param registry: EmbeddingRegistry to share loaded spaces with
+        :param mmap: memory map the embedding spaces (if no registry is given)
+        :param dtype: precision of the embedding and shared vocab matrices (see UniversalityTests)
+        :param instrumentation: Instrumentation recording time and memory of the stages
+        """
+        self.instrumentation = instrumentation or Instrumentation()
+        if registry is None:
+            registry = EmbeddingRegistry(mmap=mmap, dtype=dtype)
+        self.dtype = dtype if dtype is not None else registry.dtype
+
+        logging.debug("Loading embeddings")
+        with self.instrumentation.stage("load", spaces=len(embeds)) as record:
+            # shallow copies, as in UniversalityTests
+            self.models = [copy.copy(registry.get(embed, norm=norm)) for embed in embeds]
+            record["shapes"] = [shape(model.vectors) for model in self.models]
+
+        with self.instrumentation.stage("vocab", from_file=os.path.isfile(vocab_file)) as record:
+            self.indices = [registry.index(embed) for embed in embeds]
+            self.shared_vocab, self.rows = self.get_vocab(vocab_file)
+            self.shared = [self.cast(model.vectors[rows]) for model, rows in zip(self.models, self.rows)]
+            record["shared_vocab"] = len(self.shared_vocab)
+
+        # streamed statistics of the shared vocab matrices and joint gcca (see fit)
+        self.stats = None
+        self.gcca = None
+
+    def cast(self, array):
+        return array if self.dtype is None else array.astype(self.dtype, copy=False)
+
+    def get_vocab(self, vocab_file):
+        """
+        Load the shared vocabulary from vocab_file or extract it (and store it shuffled in vocab_file)
+        :param vocab_file: file for loading/saving the shared vocabulary
+        :return: list of shared words, their row ids in every space
+        """
+        if os.path.isfile(vocab_file):
+            logging.debug("Loading shared vocabulary")
+            with open(vocab_file, "r", encoding="utf-8") as vf:
+                shared_vocab = [line.strip() for line in vf if line.strip()]
+            rows = [index.lookup(shared_vocab) for index in self.indices]
+            for index_rows in rows:
+                if np.any(index_rows < 0):
+                    word = shared_vocab[np.flatnonzero(index_rows < 0)[0]]
+                    raise KeyError("word '{}' of {} not in vocabulary".format(word, vocab_file))
+        else:
+            logging.debug("Extracting vocabulary shared by {} spaces".format(len(self.indices)))
+            words, rows = shared_rows(self.indices)
+            order = list(range(len(words)))
+            random.shuffle(order)
+            shared_vocab = words[order].tolist()
+            rows = [index_rows[order] for index_rows in rows]
+            with open(vocab_file, "w", encoding="utf-8") as vf:
+                for word in shared_vocab:
+                    vf.write(word + "\n")
+        return shared_vocab, rows
+
+    def fit(self):
+        """
+        Fit a single GCCA of all spaces on the statistics of the shared vocab matrices
+        :return: GCCA
+        """
+        if self.gcca is None:
+            with self.instrumentation.stage("fit", algorithm="gcca", spaces=len(self.shared)):
+                self.stats = accumulate(self.shared)
+                self.gcca = GCCA(dtype=self.dtype)
+                self.gcca.fit_stats(self.stats)
+        return self.gcca
+
+    def get_pairwise_correlations(self):
+        """
+        Dimension-wise correlations of all pairs of spaces in the jointly aligned space
+        (computed from the joint covariance without transforming the spaces)
+        :return: N x N x k array of correlations (in the ascending order of the gcca eigenvalues)
+        """
+        gcca = self.fit()
+        n = len(self.shared)
+        with self.instrumentation.stage("score", algorithm="gcca", closed_form=True, spaces=n):
+            thetas = [gcca.theta[self.stats.view_slice(i)] for i in range(n)]
+            corr = np.ones((n, n, gcca.theta.shape[1]))
+            for i in range(n):
+                for j in range(i + 1, n):
+                    corr[i, j] = corr[j, i] = self.stats.mapped_correlations(thetas[i], thetas[j], i, j)
+        return corr
+
+    def similarity_matrix(self):
+        """
+        :return: N x N matrix of CCA measures in the jointly aligned space
+        """
+        return self.get_pairwise_correlations().mean(axis=2)
+
+    def save_mapped(self, paths):
+        """
+        Transform and save the complete spaces in the jointly aligned space
+        :param paths: output path for every space
+        """
+        gcca = self.fit()
+        with self.instrumentation.stage("save", algorithm="gcca"):
+            for i, (model, path) in enumerate(zip(self.models, paths)):
+                mapped = copy.copy(model)
+                mapped.vectors = gcca.transform_view(model.vectors, i)
+                mapped.save(path)
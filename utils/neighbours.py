@@ -0,0 +1,88 @@
+# Exact k nearest neighbours of the words of an embedding space and the neighbourhood overlap of two spaces
+
+import numpy as np
+
+# number of similarities computed at once (query rows x vocabulary, i.e. 256 MB in float64)
+BLOCK_ELEMENTS = 1 << 25
+# number of words per group of columns, whose maxima preselect the candidate neighbours
+GROUP_SIZE = 256
+
+
+def top_k(vectors, rows, k=10, block_elements=BLOCK_ELEMENTS, group_size=GROUP_SIZE):
+    """
+    Exact k nearest neighbours by cosine similarity among all rows of the space (excluding the word itself).
+    The similarities are computed for blocks of query rows with a single matrix product each and normalized
+    with the norms of the query rows and the columns, so memory only depends on the block size (the vectors need
+    not be normalized, e.g. a read-only memory map of the raw space). The k nearest neighbours lie in the k groups of columns with the largest maxima,
+    so only these k * group_size similarities per word are sorted (instead of all of them)
+    :param vectors: embedding matrix
+    :param rows: row ids of the query words
+    :param k: number of neighbours
+    :param block_elements: maximum number of similarities per block
+    :param group_size: number of columns per group
+    :return: row ids of the neighbours (len(rows) x k, most similar first)
+    """
+    rows = np.asarray(rows)
+    n = len(vectors)
+    if k >= n:
+        raise ValueError("{} neighbours requested in a space of {} words".format(k, n))
+    # inverse l2 norms of all rows (zero vectors are never neighbours)
+    norms = np.linalg.norm(vectors, axis=1)
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0).astype(vectors.dtype, copy=False)
+    zero = np.flatnonzero(norms == 0)
+    n_full = n - n % group_size
+    neighbours = np.empty((len(rows), k), dtype=np.int64)
+    block_size = max(1, block_elements // n)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = (vectors[block] * inverse[block, None]).dot(vectors.T)
+        sims *= inverse
+        sims[:, zero] = -np.inf
+        sims[np.arange(len(block)), block] = -np.inf
+        if n_full // group_size >= k:
+            # maxima of the groups of columns (the last, incomplete group separately)
+            maxima = sims[:, :n_full].reshape(len(block), -1, group_size).max(axis=2)
+            if n_full < n:
+                maxima = np.concatenate([maxima, sims[:, n_full:].max(axis=1, keepdims=True)], axis=1)
+            groups = np.argpartition(-maxima, k - 1, axis=1)[:, :k]
+            columns = (groups[:, :, None] * group_size + np.arange(group_size)).reshape(len(block), -1)
+            candidate_sims = np.take_along_axis(sims, np.minimum(columns, n - 1), axis=1)
+            # beyond the end of the incomplete group
+            candidate_sims[columns >= n] = -np.inf
+        else:
+            columns, candidate_sims = np.broadcast_to(np.arange(n), sims.shape), sims
+        candidates = np.argpartition(-candidate_sims, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(candidate_sims, candidates, axis=1), axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(columns, np.take_along_axis(candidates, order, axis=1),
+                                                                  axis=1)
+    return neighbours
+
+
+def neighbour_overlap(src_neighbours, trg_neighbours, src_rows, trg_rows, n_src, n_trg, chunk_size=10000):
+    """
+    Portion of the k nearest neighbours of every shared word that are also neighbours of its counterpart in the
+    other space (neighbours are compared as entries of the shared vocabulary, other neighbours never overlap)
+    :param src_neighbours: neighbour row ids of the shared words in the source space (see top_k)
+    :param trg_neighbours: neighbour row ids of the shared words in the target space
+    :param src_rows: row ids of the shared vocabulary in the source space
+    :param trg_rows: row ids of the shared vocabulary in the target space
+    :param n_src: vocabulary size of the source space
+    :param n_trg: vocabulary size of the target space
+    :param chunk_size: number of words compared at once
+    :return: overlap per shared word (between 0 and 1)
+    """
+    # position of every word in the shared vocabulary (-1 if not shared)
+    src_pos = np.full(n_src, -1, dtype=np.int64)
+    src_pos[src_rows] = np.arange(len(src_rows))
+    trg_pos = np.full(n_trg, -1, dtype=np.int64)
+    trg_pos[trg_rows] = np.arange(len(trg_rows))
+    src_neighbours, trg_neighbours = src_pos[src_neighbours], trg_pos[trg_neighbours]
+
+    k = src_neighbours.shape[1]
+    overlap = np.empty(len(src_neighbours))
+    for start in range(0, len(src_neighbours), chunk_size):
+        src, trg = src_neighbours[start:start + chunk_size], trg_neighbours[start:start + chunk_size]
+        # compare all k x k neighbour pairs of each word
+        common = (src[:, :, None] == trg[:, None, :]).any(axis=2) & (src >= 0)
+        overlap[start:start + chunk_size] = common.sum(axis=1) / k
+    return overlap
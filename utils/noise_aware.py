@@ -1,6 +1,7 @@
 # Noise Aware Alignment implementation from Lubin et. al (2019)
 # https://github.com/NoaKel/Noise-Aware-Alignment
 
+import logging
 import numpy as np
 from scipy.linalg import orthogonal_procrustes
     
@@ -14,11 +15,20 @@ def P(Y, dim, mu, s):
     :return: probability
     """
     C = -dim/2*(np.log(2*np.pi*s))
-    exp = (-.5 * np.einsum('ij, ij -> i',\
-        Y - mu, np.dot(np.eye(dim)*(1/s) , (Y - mu).T).T ))
+    # isotropic covariance, i.e. the mahalanobis distance is the scaled squared euclidean distance
+    diff = Y - mu
+    exp = -.5 / s * sq_norms(diff)
     return C + exp
 
-def EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
+def sq_norms(A):
+    """
+    calculates squared euclidean norms of all rows (accumulated in float64, also for float32 matrices)
+    :param A: matrix
+    :return: squared norm per row
+    """
+    return np.einsum('ij, ij -> i', A, A, dtype=np.float64)
+
+def EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft, history=None):
     """
     EM noise aware
     :param X: matrix 1
@@ -29,6 +39,7 @@ def EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
     :param muy: noisy pairs mean
     :param sigmay: noisy pair variance
     :param is_soft: true - soft EM, false - hard EM
+    :param history: list the parameters of every iteration are appended to (optional)
     :return: transform matrix, alpha, clean indices, noisy indices
     """
     n, dim = X.shape
@@ -39,53 +50,58 @@ def EM_aux(X, Y, alpha, Q, sigma, muy, sigmay, is_soft):
         j = j + 1
         prev_alpha = alpha
         # E-step
-        ws = [0] * n
-        nom = [0] * n
-        sup = [0] * n
-        nom[:] = np.log(alpha) + P(Y, dim, np.dot(X, Q), sigma)
-        sup[:] = np.log((1 - alpha)) + P(Y, dim, muy, sigmay)
-        m = max(nom)
-        ws[:] = np.exp(nom[:] - m) / (np.exp(nom[:] - m) + np.exp(sup[:] - m))
+        nom = np.log(alpha) + P(Y, dim, np.dot(X, Q), sigma)
+        sup = np.log((1 - alpha)) + P(Y, dim, muy, sigmay)
+        m = nom.max()
+        ws = np.exp(nom - m) / (np.exp(nom - m) + np.exp(sup - m))
         ws = np.where(np.isnan(ws), 0, ws)
         # M-step
         if is_soft:
-            sum_ws = float(sum(ws))
+            sum_ws = float(ws.sum())
             alpha = sum_ws / float(n)
-            Q, _ = orthogonal_procrustes(np.multiply(np.array(ws).reshape((n,1)),X), np.multiply(np.array(ws).reshape((n,1)),Y))
-            sigma = sum(np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 * ws[i] for i in range(0,n)) / (sum_ws * dim)
-            muy = sum(Y[i, :] * (1 - ws[i]) for i in range(0,n)) / (n-sum_ws)
-            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 * (1 - ws[i]) for i in range(0,n)) / ((n-sum_ws) * dim)
+            w = ws.astype(X.dtype, copy=False)
+            Q, _ = orthogonal_procrustes(w[:, None] * X, w[:, None] * Y)
+            sigma = np.dot(ws, sq_norms(np.dot(X, Q) - Y)) / (sum_ws * dim)
+            # weighted mean accumulated in float64, kept in the precision of Y
+            muy = (np.einsum('i, ij -> j', 1 - ws, Y, dtype=np.float64) / (n - sum_ws)).astype(Y.dtype, copy=False)
+            sigmay = np.dot(1 - ws, sq_norms(muy - Y)) / ((n - sum_ws) * dim)
         else: #hard EM
-            t_indices = np.where(np.asarray(ws) >= 0.5)[0]
-            f_indices = np.where(np.asarray(ws) < 0.5)[0]
+            t_indices = np.where(ws >= 0.5)[0]
+            f_indices = np.where(ws < 0.5)[0]
             assert (len(t_indices) > 0)
             assert (len(f_indices) > 0)
-            X_clean = np.squeeze(X[[t_indices], :])
-            Y_clean = np.squeeze(Y[[t_indices], :])
+            X_clean = X[t_indices]
+            Y_clean = Y[t_indices]
             alpha = float(len(t_indices)) / float(n)
             Q, _ = orthogonal_procrustes(X_clean, Y_clean)
-            sigma = sum(np.linalg.norm(np.dot(X[i, :], Q) - Y[i, :]) ** 2 for i in t_indices) / (len(t_indices) * dim)
-            muy = sum(Y[i, :] for i in f_indices) / len(f_indices)
-            sigmay = sum(np.linalg.norm(muy - Y[i, :]) ** 2 for i in f_indices) / (len(f_indices) * dim)
-        print('iter:', j, 'alpha:', round(alpha,3), 'sigma:', round(sigma,3), 'sigmay', round(sigmay,3))
+            sigma = sq_norms(np.dot(X_clean, Q) - Y_clean).sum() / (len(t_indices) * dim)
+            muy = Y[f_indices].mean(axis=0, dtype=np.float64).astype(Y.dtype, copy=False)
+            sigmay = sq_norms(muy - Y[f_indices]).sum() / (len(f_indices) * dim)
+        logging.debug('iter: {} alpha: {:.3f} sigma: {:.3f} sigmay: {:.3f}'.format(j, alpha, sigma, sigmay))
+        if history is not None:
+            history.append({"iteration": j, "alpha": float(alpha), "sigma": float(sigma), "sigmay": float(sigmay),
+                            "delta_alpha": float(abs(alpha - prev_alpha))})
             
-    t_indices = np.where(np.asarray(ws) >= 0.5)[0]
-    f_indices = np.where(np.asarray(ws) < 0.5)[0]
+    t_indices = np.where(ws >= 0.5)[0]
+    f_indices = np.where(ws < 0.5)[0]
     return np.asarray(Q), alpha, t_indices, f_indices
 
-def noise_aware(X, Y, is_soft=False):
+def noise_aware(X, Y, is_soft=False, Q_start=None, history=None):
     """
     noise aware alignment
     :param X: matrix 1
     :param Y: matrix 2
     :param is_soft: true - soft EM, false - hard EM
+    :param Q_start: procrustes solution of X and Y (computed if None)
+    :param history: list the parameters of every EM iteration are appended to (optional)
     :return: transform matrix, alpha, clean indices, noisy indices
     """
     n, dim = X.shape
-    Q_start, _ = orthogonal_procrustes(X, Y)
-    sigma_start = np.linalg.norm(np.dot(X,Q_start) - Y)**2 / (n * dim)
-    muy_start = np.mean(Y, axis=0)
-    sigmay_start = np.var(Y)
+    if Q_start is None:
+        Q_start, _ = orthogonal_procrustes(X, Y)
+    sigma_start = sq_norms(np.dot(X,Q_start) - Y).sum() / (n * dim)
+    muy_start = np.mean(Y, axis=0, dtype=np.float64).astype(Y.dtype, copy=False)
+    sigmay_start = np.var(Y, dtype=np.float64)
     alpha_start = 0.5
-    return EM_aux(X, Y, alpha_start, Q_start, sigma_start, muy_start, sigmay_start, is_soft)
+    return EM_aux(X, Y, alpha_start, Q_start, sigma_start, muy_start, sigmay_start, is_soft, history)
     
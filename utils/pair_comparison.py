@@ -0,0 +1,213 @@
+# CCA measure before and after mapping two embedding spaces (as written by mapping_correlation.py)
+
+import os
+import sys
+import numpy as np
+from tabulate import tabulate
+from utils.UniversalityTests import UniversalityTests
+from utils.instrumentation import Instrumentation
+from utils.results import ResultStore, store_path, encode_names
+from utils.scheduler import run_jobs
+
+
+def cached_correlations(cache, src_emb, trg_emb, vocab, algorithm):
+    """
+    Cached dimension-wise correlations before and after mapping two embedding spaces
+    :param cache: ResultCache
+    :param vocab: shared vocabulary file
+    :return: correlations before and after mapping or None if the pair has not been compared before
+    """
+    if cache is None or not os.path.isfile(vocab):
+        return None
+    entry_pre = cache.get(cache.key(src_emb, trg_emb, vocab, None))
+    entry_post = cache.get(cache.key(src_emb, trg_emb, vocab, algorithm))
+    if entry_pre is None or entry_post is None:
+        return None
+    return entry_pre["corr"], entry_post["corr"]
+
+
+def compare_pair(registry, work_dir, src_emb, trg_emb, vocab, dictionary=None, algorithm="gcca", cache=None,
+                 store=None, run=0):
+    """
+    Compute the CCA measure before and after mapping two embedding spaces and store the results:
+    the dimension-wise correlations before ("none") and after mapping are appended to the results store
+    (as the comparison named after work_dir), <work_dir>.jsonl will contain time and memory
+    records of the comparison stages (mapped embeddings and the shared vocabulary are stored in work_dir, too)
+    :param registry: EmbeddingRegistry used for loading the embedding spaces
+    :param work_dir: directory for the results (named after the comparison)
+    :param src_emb: source embedding
+    :param trg_emb: target embedding
+    :param vocab: file for loading/saving shared vocabulary (relative to work_dir)
+    :param dictionary: dictionary for extracting shared vocabulary in cross-lingual comparison
+    :param algorithm: mapping algorithm passed to UniversalityTests.map_spaces
+    :param cache: ResultCache, if the pair has been compared before the cached correlations are used
+    (and the mapped embeddings are not stored again)
+    :param store: ResultStore (defaults to the store in the parent directory of work_dir, see store_path)
+    :param run: simulation run the spaces were trained in (0 for the original spaces)
+    :return: CCA measure before and after mapping
+    """
+    src_emb, trg_emb = os.path.abspath(src_emb), os.path.abspath(trg_emb)
+    if dictionary:
+        dictionary = os.path.abspath(dictionary)
+
+    if store is None:
+        store = ResultStore(store_path(work_dir))
+
+    cwd = os.getcwd()
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    try:
+        name = os.path.basename(os.getcwd())
+        # fail before comparing if the results can not be stored
+        encode_names(name, algorithm)
+        instrumentation = Instrumentation(name + ".jsonl", src=os.path.basename(src_emb),
+                                          trg=os.path.basename(trg_emb))
+
+        cached = cached_correlations(cache, src_emb, trg_emb, vocab, algorithm)
+        if cached is not None:
+            corr, corr_post = cached
+        else:
+            # load embeddings
+            embedding_tests = UniversalityTests(src_emb, trg_emb, vocab, dictionary=dictionary, registry=registry,
+                                                instrumentation=instrumentation)
+
+            # calculate dimension wise correlations
+            corr = embedding_tests.get_embedding_correlations()
+
+            # map spaces
+            embedding_tests.map_spaces(algorithm, src_mapped_embed="mapped_src_" + os.path.basename(src_emb),
+                                       trg_mapped_embed="mapped_trg_" + os.path.basename(trg_emb))
+
+            # calculate dimension wise correlations
+            corr_post = embedding_tests.get_embedding_correlations()
+
+            if cache is not None:
+                cache.put(cache.key(src_emb, trg_emb, vocab, None), corr=corr)
+                cache.put(cache.key(src_emb, trg_emb, vocab, algorithm), corr=corr_post,
+                          **embedding_tests.mapping)
+
+        # convert to CCA measure
+        cca_measure_pre = np.mean(corr)
+        cca_measure_post = np.mean(corr_post)
+
+        if algorithm == "gcca":
+            # gcca implementation returns correlations in ascending order
+            corr_post = np.flip(corr_post)
+        store.append(name, None, run, corr)
+        store.append(name, algorithm, run, corr_post)
+    finally:
+        os.chdir(cwd)
+
+    return cca_measure_pre, cca_measure_post
+
+
+def compare_algorithms(registry, work_dir, src_emb, trg_emb, vocab, algorithms, dictionary=None, cache=None,
+                       store=None, run=0):
+    """
+    Compute the CCA measure before and after mapping two embedding spaces with each of the given algorithms
+    (the spaces are loaded and their statistics computed only once) and store the results:
+    the dimension-wise correlations before ("none") and after mapping with every algorithm are appended to the
+    results store (as in compare_pair), <work_dir>.algorithms.txt will contain a table of the CCA measures per
+    algorithm, <work_dir>.jsonl will contain time and memory records of the comparison stages
+    :param registry: EmbeddingRegistry used for loading the embedding spaces
+    :param work_dir: directory for the results (named after the comparison)
+    :param src_emb: source embedding
+    :param trg_emb: target embedding
+    :param vocab: file for loading/saving shared vocabulary (relative to work_dir)
+    :param algorithms: list of mapping algorithms
+    :param dictionary: dictionary for extracting shared vocabulary in cross-lingual comparison
+    :param cache: ResultCache, algorithms compared before are not recomputed (the spaces are not loaded at all
+    if every algorithm has been compared before)
+    :param store: ResultStore (defaults to the store in the parent directory of work_dir, see store_path)
+    :param run: simulation run the spaces were trained in (0 for the original spaces)
+    :return: list of (algorithm, CCA measure) rows, starting with the unmapped spaces ("none")
+    """
+    src_emb, trg_emb = os.path.abspath(src_emb), os.path.abspath(trg_emb)
+    if dictionary:
+        dictionary = os.path.abspath(dictionary)
+
+    if store is None:
+        store = ResultStore(store_path(work_dir))
+
+    cwd = os.getcwd()
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+    try:
+        name = os.path.basename(os.getcwd())
+        # fail before comparing if the results can not be stored
+        for algorithm in algorithms:
+            encode_names(name, algorithm)
+        results = {}
+        if cache is not None and os.path.isfile(vocab):
+            for algorithm in [None] + list(algorithms):
+                entry = cache.get(cache.key(src_emb, trg_emb, vocab, algorithm))
+                if entry is not None:
+                    results[algorithm] = entry["corr"]
+
+        missing = [algorithm for algorithm in algorithms if algorithm not in results]
+        if missing or None not in results:
+            instrumentation = Instrumentation(name + ".jsonl", src=os.path.basename(src_emb),
+                                              trg=os.path.basename(trg_emb))
+            embedding_tests = UniversalityTests(src_emb, trg_emb, vocab, dictionary=dictionary, registry=registry,
+                                                instrumentation=instrumentation)
+            mappings = {}
+            computed = embedding_tests.compare_algorithms(missing, mappings)
+            results.update(computed)
+            if cache is not None:
+                for algorithm, corr in computed.items():
+                    cache.put(cache.key(src_emb, trg_emb, vocab, algorithm), corr=corr, **mappings.get(algorithm, {}))
+
+        rows = []
+        for algorithm in [None] + list(algorithms):
+            corr = results[algorithm]
+            rows.append((algorithm or "none", np.mean(corr)))
+            # gcca implementation returns correlations in ascending order
+            store.append(name, algorithm, run, np.flip(corr) if algorithm == "gcca" else corr)
+
+        table = tabulate(rows, headers=["algorithm", "CCA measure"], floatfmt='0.4f')
+        with open(name + ".algorithms.txt", 'w') as out:
+            out.write(table + "\n")
+    finally:
+        os.chdir(cwd)
+
+    return rows
+
+
+def read_pairs(pairs_file):
+    """
+    Read a batch of comparisons (one per line: work_dir src_emb trg_emb vocab [dict], lines starting with # are skipped)
+    :param pairs_file: path to the batch file ("-" for stdin)
+    :return: list of (work_dir, src_emb, trg_emb, vocab, dictionary) tuples
+    """
+    pf = sys.stdin if pairs_file == "-" else open(pairs_file, encoding="utf-8")
+    pairs = []
+    try:
+        for line in pf:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            work_dir, src_emb, trg_emb, vocab = fields[:4]
+            pairs.append((work_dir, src_emb, trg_emb, vocab, fields[4] if len(fields) > 4 else None))
+    finally:
+        if pf is not sys.stdin:
+            pf.close()
+    return pairs
+
+
+def compare_batch(registry, pairs, algorithm="gcca", cache=None, processes=1):
+    """
+    Run compare_pair for a batch of comparisons in one process or on a pool of worker processes
+    :param registry: EmbeddingRegistry used for loading the embedding spaces (shared by all comparisons)
+    :param pairs: list of (work_dir, src_emb, trg_emb, vocab, dictionary) tuples (see read_pairs)
+    :param algorithm: mapping algorithm
+    :param cache: ResultCache for the mappings and correlations of compared pairs
+    :param processes: number of worker processes
+    :return: list of (CCA measure before mapping, CCA measure after mapping) in the order of pairs
+    """
+    jobs = [pair + (algorithm, cache) for pair in pairs]
+    # load every embedding space of the pairs not compared before once, the worker processes share them
+    if processes > 1:
+        registry.preload(sorted({emb for job in jobs for emb in job[1:3]
+                                 if cached_correlations(cache, job[1], job[2], os.path.join(job[0], job[3]),
+                                                        algorithm) is None}))
+    return run_jobs(compare_pair, jobs, registry, processes=processes)
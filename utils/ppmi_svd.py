@@ -0,0 +1,215 @@
+# PPMI+SVD embeddings following the hyperwords implementation of Levy et al. (2015)
+# https://bitbucket.org/omerlevy/hyperwords
+
+import os
+import logging
+import threading
+import multiprocessing
+import numpy as np
+import scipy.sparse as sparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse.linalg import svds
+from gensim.models.keyedvectors import KeyedVectors
+
+# number of lines per chunk when tokenizing the corpus
+LINE_CHUNK = 100000
+# number of tokens per chunk when counting co-occurrences
+TOKEN_CHUNK = 10**7
+
+# corpus and encoding shared with forked worker processes
+_corpus = None
+_vocab = None
+
+
+def _count_words(lines):
+    return Counter(word for line in _corpus.iter_lines(lines) for word in line.split())
+
+
+def _encode(lines):
+    # token ids (-1 for rare words) and number of tokens per line (in order of the given lines)
+    tokens, lengths = [], []
+    for line in _corpus.iter_lines(lines):
+        words = line.split()
+        tokens.extend(_vocab.get(word, -1) for word in words)
+        lengths.append(len(words))
+    return np.asarray(tokens, dtype=np.int32), np.asarray(lengths, dtype=np.int64)
+
+
+class EncodedCorpus:
+    """
+    Corpus as array of integer token ids, tokenized once and shared by all trainings on subsets of its lines
+    (e.g. the halves of all simulation runs)
+    """
+    def __init__(self, corpus, thr=50, processes=1):
+        """
+        :param corpus: LineIndex
+        :param thr: minimum word count (rarer words can not reach the threshold in any subset of the corpus)
+        :param processes: number of processes for tokenization
+        """
+        global _corpus, _vocab
+        chunks = [np.arange(start, min(start + LINE_CHUNK, len(corpus))) for start in range(0, len(corpus), LINE_CHUNK)]
+        _corpus = corpus
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                logging.info("Counting words")
+                counts = Counter()
+                for chunk_counts in pool.imap_unordered(_count_words, chunks):
+                    counts.update(chunk_counts)
+            # ids sorted by frequency
+            self.words = [word for word, count in counts.most_common() if count >= thr]
+            _vocab = {word: i for i, word in enumerate(self.words)}
+            # new pool, so that the workers are forked with the vocabulary
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                logging.info("Encoding corpus")
+                encoded = pool.map(_encode, chunks)
+        finally:
+            _corpus, _vocab = None, None
+
+        # iter_lines returns the lines of a chunk in corpus order, i.e. the chunks are sorted by line id
+        self.tokens = np.concatenate([tokens for tokens, _ in encoded] + [np.zeros(0, np.int32)])
+        lengths = np.concatenate([lengths for _, lengths in encoded] + [np.zeros(0, np.int64)])
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    def gather(self, lines):
+        """
+        Tokens of the given lines
+        :param lines: line ids
+        :return: token ids and line number (position in lines) of every token
+        """
+        lines = np.asarray(lines)
+        lengths = self.offsets[lines + 1] - self.offsets[lines]
+        line_of = np.repeat(np.arange(len(lines)), lengths)
+        # position of every token: start of its line + position within the line
+        positions = np.repeat(self.offsets[lines], lengths) + np.arange(lengths.sum()) - \
+            np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self.tokens[positions], line_of
+
+
+def count_pairs(tokens, line_of, vocab_size, win, first=None):
+    """
+    Co-occurrence counts of words and contexts within a symmetric window (not crossing line boundaries)
+    :param tokens: token ids (-1 for out-of-vocabulary words, which are not deleted before windowing)
+    :param line_of: line number of every token
+    :param vocab_size: vocabulary size
+    :param win: window size
+    :param first: only count pairs whose left token is one of the first tokens (all if None)
+    :return: sparse vocab_size x vocab_size count matrix
+    """
+    codes = []
+    for d in range(1, win + 1):
+        words, contexts = tokens[:-d][:first], tokens[d:][:first]
+        valid = (words >= 0) & (contexts >= 0) & (line_of[:-d][:first] == line_of[d:][:first])
+        codes.append(words[valid].astype(np.int64) * vocab_size + contexts[valid])
+    codes, counts = np.unique(np.concatenate(codes + [np.zeros(0, np.int64)]), return_counts=True)
+    counts = sparse.csr_matrix((counts.astype(np.float64), (codes // vocab_size, codes % vocab_size)),
+                               shape=(vocab_size, vocab_size))
+    # the window is symmetric, contexts to the left are the transposed counts
+    return counts + counts.T
+
+
+def ppmi(counts, cds=0.75, neg=1):
+    """
+    Positive pointwise mutual information with context distribution smoothing
+    :param counts: sparse co-occurrence count matrix
+    :param cds: context distribution smoothing exponent
+    :param neg: shift of the pmi values (log(neg) is subtracted)
+    :return: sparse ppmi matrix
+    """
+    sum_w = np.asarray(counts.sum(axis=1)).ravel()
+    sum_c = np.asarray(counts.sum(axis=0)).ravel() ** cds
+    counts = counts.tocoo()
+    pmi = np.log(counts.data * sum_c.sum() / (sum_w[counts.row] * sum_c[counts.col])) - np.log(neg)
+    pmi = sparse.csr_matrix((np.maximum(pmi, 0), (counts.row, counts.col)), shape=counts.shape)
+    pmi.eliminate_zeros()
+    return pmi
+
+
+class PPMISVDTrainer:
+    """
+    Trains PPMI+SVD embeddings (hyperwords settings --thr 50 --win 5 --cds 0.75 --dim 100 --eig 0.0 by default)
+    on subsets of the lines of a corpus, can be used as trainer in utils.simulation.run_simulation
+    """
+    def __init__(self, thr=50, win=5, cds=0.75, dim=100, eig=0.0, neg=1, normalize=False, workers=4):
+        """
+        :param thr: minimum word count
+        :param win: window size
+        :param cds: context distribution smoothing exponent
+        :param dim: embedding dimension
+        :param eig: weighting exponent of the singular values
+        :param neg: pmi shift
+        :param normalize: whether to l2 normalize the vectors
+        :param workers: number of processes (tokenization) and threads (counting)
+        """
+        self.thr, self.win, self.cds, self.dim, self.eig, self.neg = thr, win, cds, dim, eig, neg
+        self.normalize = normalize
+        self.workers = workers
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    def prepare(self, corpus):
+        """
+        Tokenize the corpus (done once per corpus, best before starting concurrent trainings)
+        :param corpus: LineIndex
+        :return: EncodedCorpus
+        """
+        # keyed by the corpus files (the id of a discarded LineIndex may be reused by a new one)
+        key = tuple(os.path.abspath(path) for path in corpus.paths)
+        with self.lock:
+            if key not in self.encoded:
+                self.encoded[key] = EncodedCorpus(corpus, self.thr, self.workers)
+            return self.encoded[key]
+
+    def fit(self, corpus, lines):
+        """
+        :param corpus: LineIndex
+        :param lines: line ids of the training corpus
+        :return: KeyedVectors
+        """
+        encoded = self.prepare(corpus)
+        tokens, line_of = encoded.gather(np.sort(lines))
+
+        # vocabulary of the training corpus (word ids are ordered by frequency in the complete corpus)
+        word_counts = np.bincount(tokens[tokens >= 0], minlength=len(encoded.words))
+        in_vocab = word_counts >= self.thr
+        remap = np.append(np.where(in_vocab, np.cumsum(in_vocab) - 1, -1), -1).astype(np.int32)
+        tokens = remap[tokens]
+        words = [word for word, known in zip(encoded.words, in_vocab) if known]
+        if len(words) <= self.dim:
+            raise ValueError("Vocabulary of {} words (count >= {}) is too small for {} dimensions".format(
+                len(words), self.thr, self.dim))
+        logging.info("Counting co-occurrences of {} words in {} tokens".format(len(words), len(tokens)))
+
+        # count chunks in parallel (each chunk also reads the first tokens of the next one,
+        # pairs are counted in the chunk of their first token)
+        def count_chunk(start):
+            end = min(start + TOKEN_CHUNK + self.win, len(tokens))
+            return count_pairs(tokens[start:end], line_of[start:end], len(words), self.win, TOKEN_CHUNK)
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            counts = sum(pool.map(count_chunk, range(0, len(tokens), TOKEN_CHUNK)),
+                         sparse.csr_matrix((len(words), len(words))))
+
+        logging.info("Calculating PPMI and SVD")
+        u, s, _ = svds(ppmi(counts, self.cds, self.neg), k=self.dim)
+        # svds returns the singular values in ascending order
+        order = np.argsort(-s)
+        vectors = u[:, order] * s[order] ** self.eig
+        if self.normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), np.finfo(float).eps)
+
+        model = KeyedVectors(self.dim)
+        model.add(words, vectors.astype(np.float32))
+        return model
+
+    def train(self, corpus, lines, out_dir, name):
+        """
+        :param corpus: LineIndex
+        :param lines: line ids of the training corpus
+        :param out_dir: directory for the embedding space
+        :param name: name of the training corpus
+        :return: path to the trained embedding space <out_dir>/<name>.emb
+        """
+        path = os.path.join(out_dir, name + ".emb")
+        self.fit(corpus, lines).save(path)
+        return path
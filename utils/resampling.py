@@ -0,0 +1,152 @@
+# Bootstrap confidence intervals and permutation tests for the CCA measure of two embedding spaces
+
+import logging
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from utils.gcca import canonical_correlations
+
+# CCA measure with bootstrap confidence interval and permutation p-value
+Significance = namedtuple("Significance", ["measure", "ci_low", "ci_high", "p_value"])
+
+
+def cca_measure_cov(cov_xx, cov_yy, cov_xy, statistic="gcca"):
+    """
+    CCA measure given the covariance blocks of two views
+    :param statistic: "gcca" for the mean canonical correlation (measure after gcca mapping),
+    None for the mean dimension-wise correlation (measure of the unmapped spaces)
+    :return: CCA measure
+    """
+    if statistic == "gcca":
+        corr = canonical_correlations(cov_xx, cov_yy, cov_xy, min(len(cov_xx), len(cov_yy)))
+    elif statistic is None:
+        corr = np.diag(cov_xy) / np.sqrt(np.diag(cov_xx) * np.diag(cov_yy))
+    else:
+        raise ValueError("Resampling is not available for statistic '{}'".format(statistic))
+    return np.mean(corr)
+
+
+class BlockMoments:
+    """
+    Sums and second moments of blocks of consecutive (centered) rows of two views.
+    A bootstrap replicate draws blocks with replacement and only sums the weighted block moments
+    instead of touching the rows again (the shared vocabulary is shuffled, so the blocks are random subsets)
+    """
+    def __init__(self, x, y, n_blocks=100):
+        """
+        :param x: shared vocab matrix of the first space
+        :param y: shared vocab matrix of the second space (same number of rows)
+        :param n_blocks: number of blocks
+        """
+        self.dims = [x.shape[1], y.shape[1]]
+        self.mean = np.concatenate([x.mean(axis=0, dtype=np.float64), y.mean(axis=0, dtype=np.float64)])
+        bounds = np.linspace(0, len(x), min(n_blocks, len(x)) + 1).astype(int)
+        self.sizes = np.diff(bounds)
+        self.sums = np.zeros((len(self.sizes), sum(self.dims)))
+        self.moments = np.zeros((len(self.sizes), sum(self.dims), sum(self.dims)))
+        for b, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            block = np.concatenate([x[start:end], y[start:end]], axis=1).astype(np.float64) - self.mean
+            self.sums[b] = block.sum(axis=0)
+            self.moments[b] = block.T.dot(block)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def cov(self, weights=None):
+        """
+        Covariance matrix of the concatenated views
+        :param weights: number of times every block is drawn (all blocks once if None)
+        :return: covariance matrix
+        """
+        if weights is None:
+            weights = np.ones(len(self))
+        n = weights.dot(self.sizes)
+        sums = weights.dot(self.sums)
+        moments = np.tensordot(weights, self.moments, axes=1)
+        return (moments - np.outer(sums, sums) / n) / (n - 1)
+
+    def measure(self, weights=None, statistic="gcca"):
+        cov = self.cov(weights)
+        d = self.dims[0]
+        return cca_measure_cov(cov[:d, :d], cov[d:, d:], cov[:d, d:], statistic)
+
+
+def bootstrap(moments, n_resamples=1000, statistic="gcca", seed=0, workers=4):
+    """
+    Block bootstrap distribution of the CCA measure
+    :param moments: BlockMoments of the shared vocab matrices
+    :param n_resamples: number of bootstrap replicates
+    :param statistic: see cca_measure_cov
+    :param seed: random seed (every replicate has its own generator, results do not depend on the threads)
+    :param workers: number of threads
+    :return: CCA measure of every replicate
+    """
+    def replicate(r):
+        weights = np.random.default_rng([seed, r]).multinomial(len(moments), np.full(len(moments), 1 / len(moments)))
+        return moments.measure(weights, statistic)
+
+    with ThreadPoolExecutor(workers) as pool:
+        return np.fromiter(pool.map(replicate, range(n_resamples)), dtype=np.float64, count=n_resamples)
+
+
+def permutation_null(x, y, moments, n_permutations=1000, statistic="gcca", seed=0, workers=4):
+    """
+    Distribution of the CCA measure when the rows of the second space are randomly permuted (i.e. under the
+    null hypothesis that the spaces are unrelated). Only the cross-covariance block changes under permutation,
+    the within-space blocks are taken from the precomputed moments.
+    :param x: shared vocab matrix of the first space
+    :param y: shared vocab matrix of the second space
+    :param moments: BlockMoments of x and y
+    :param n_permutations: number of permutations
+    :param statistic: see cca_measure_cov
+    :param seed: random seed
+    :param workers: number of threads
+    :return: CCA measure of every permutation
+    """
+    d = moments.dims[0]
+    cov = moments.cov()
+    x = np.asarray(x, dtype=np.float64) - moments.mean[:d]
+    y = np.asarray(y, dtype=np.float64) - moments.mean[d:]
+
+    def permutation(r):
+        perm = np.random.default_rng([seed, r]).permutation(len(y))
+        cov_xy = x.T.dot(y[perm]) / (len(y) - 1)
+        return cca_measure_cov(cov[:d, :d], cov[d:, d:], cov_xy, statistic)
+
+    with ThreadPoolExecutor(workers) as pool:
+        return np.fromiter(pool.map(permutation, range(n_permutations)), dtype=np.float64, count=n_permutations)
+
+
+def significance(x, y, statistic="gcca", n_resamples=1000, n_permutations=1000, alpha=0.05, n_blocks=100, seed=0,
+                 workers=4, moments=None):
+    """
+    CCA measure of two shared vocab matrices with (basic) bootstrap confidence interval and permutation p-value
+    :param x: shared vocab matrix of the first space
+    :param y: shared vocab matrix of the second space
+    :param statistic: see cca_measure_cov
+    :param n_resamples: number of bootstrap replicates (no confidence interval if 0)
+    :param n_permutations: number of permutations (no p-value if 0)
+    :param alpha: 1 - confidence level
+    :param n_blocks: number of blocks for the block bootstrap
+    :param seed: random seed
+    :param workers: number of threads
+    :param moments: precomputed BlockMoments of x and y
+    :return: Significance
+    """
+    if moments is None:
+        moments = BlockMoments(x, y, n_blocks)
+    measure = moments.measure(statistic=statistic)
+
+    ci_low = ci_high = p_value = None
+    if n_resamples:
+        logging.debug("Bootstrapping CCA measure ({} replicates)".format(n_resamples))
+        low, high = np.percentile(bootstrap(moments, n_resamples, statistic, seed, workers),
+                                  [100 * alpha / 2, 100 * (1 - alpha / 2)])
+        # basic bootstrap interval: canonical correlations are biased upwards in the replicates
+        # (as in any sample), which the reflection around the measure corrects for
+        ci_low, ci_high = 2 * measure - high, 2 * measure - low
+    if n_permutations:
+        logging.debug("Permutation test of CCA measure ({} permutations)".format(n_permutations))
+        null = permutation_null(x, y, moments, n_permutations, statistic, seed, workers)
+        p_value = (1 + np.sum(null >= measure)) / (1 + n_permutations)
+    return Significance(measure, ci_low, ci_high, p_value)
@@ -0,0 +1,159 @@
+# Binary store of the dimension-wise correlations of all comparisons (replaces the per-directory csv and log files)
+
+import os
+import fcntl
+import logging
+import numpy as np
+
+# store of the comparisons in the sub directories of a directory (e.g. correlation/results.store)
+STORE_NAME = "results.store"
+
+MAGIC = b"EMBSIMR2"
+# header of every record, followed by the utf-8 comparison name, the algorithm and dim float64 correlations
+# (records are variable-length, so comparisons of spaces of different dimension share a store)
+RECORD_HEADER = np.dtype([("pair_len", "<u2"), ("algorithm_len", "<u2"), ("run", "<i4"), ("dim", "<u4")])
+MAX_NAME = np.iinfo(np.uint16).max
+
+
+def record_dtype(pair_width=1, algorithm_width=1):
+    """
+    :param pair_width: number of characters of the longest comparison name
+    :param algorithm_width: number of characters of the longest algorithm name
+    :return: records as returned by ResultStore.read: comparison name, mapping algorithm ("none" before mapping),
+    simulation run (0 for the original spaces), correlations (one array per record) and CCA measure
+    """
+    return np.dtype([("pair", "U{}".format(pair_width)), ("algorithm", "U{}".format(algorithm_width)),
+                     ("run", "<i4"), ("corr", object), ("measure", "<f8")])
+
+
+def encode_names(pair, algorithm):
+    """
+    :param pair: name of the comparison
+    :param algorithm: mapping algorithm (None before mapping)
+    :return: utf-8 encoded names as stored in a record
+    :raises ValueError: if a name can not be stored (e.g. to check it before comparing)
+    """
+    try:
+        pair, algorithm = pair.encode("utf-8"), (algorithm or "none").encode("utf-8")
+    except UnicodeEncodeError as e:
+        raise ValueError("Name {!r} or algorithm {!r} can not be stored: {}".format(pair, algorithm, e))
+    if not pair or len(pair) > MAX_NAME or len(algorithm) > MAX_NAME:
+        raise ValueError("Invalid name {} or algorithm {} for the results store".format(pair, algorithm))
+    return pair, algorithm
+
+
+def store_path(work_dir):
+    """
+    :param work_dir: directory of a comparison (named after the comparison)
+    :return: path of the store shared by all comparisons next to work_dir
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(work_dir)), STORE_NAME)
+
+
+class ResultStore:
+    """
+    Binary table of variable-length records, one per (comparison, algorithm, simulation run).
+    Records are appended under an exclusive file lock, so that all processes (e.g. of a batch or a simulation)
+    can write to the same store, and the whole table is read with a single np.fromfile.
+    """
+    def __init__(self, path):
+        """
+        :param path: store file (created with the first record)
+        """
+        self.path = path
+
+    def append(self, pair, algorithm, run, corr):
+        """
+        Append the correlations of a comparison
+        :param pair: name of the comparison
+        :param algorithm: mapping algorithm (None before mapping)
+        :param run: simulation run (0 for the original spaces)
+        :param corr: dimension-wise correlations
+        """
+        corr = np.asarray(corr, dtype="<f8").ravel()
+        pair, algorithm = encode_names(pair, algorithm)
+        record = np.array([(len(pair), len(algorithm), run, len(corr))], RECORD_HEADER).tobytes() + pair + \
+            algorithm + corr.tobytes()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                magic = f.read(len(MAGIC))
+                if not magic:
+                    f.write(MAGIC)
+                elif magic != MAGIC:
+                    raise ValueError("{} is not a results store".format(self.path))
+                # the whole record with a single write
+                f.write(record)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _parse(self, data):
+        pairs, algorithms, runs, correlations = [], [], [], []
+        offset = 0
+        while offset + RECORD_HEADER.itemsize <= len(data):
+            header = np.frombuffer(data, RECORD_HEADER, count=1, offset=offset)[0]
+            offset += RECORD_HEADER.itemsize
+            end = offset + int(header["pair_len"]) + int(header["algorithm_len"]) + 8 * int(header["dim"])
+            if end > len(data):
+                break
+            pair_end = offset + int(header["pair_len"])
+            corr_start = pair_end + int(header["algorithm_len"])
+            pairs.append(data[offset:pair_end].tobytes().decode("utf-8"))
+            algorithms.append(data[pair_end:corr_start].tobytes().decode("utf-8"))
+            runs.append(int(header["run"]))
+            correlations.append(np.frombuffer(data, "<f8", count=int(header["dim"]), offset=corr_start).copy())
+            offset = end
+        if offset < len(data):
+            logging.warning("Ignoring an incomplete record at the end of {}".format(self.path))
+        records = np.zeros(len(pairs), record_dtype(max(map(len, pairs), default=1),
+                                                    max(map(len, algorithms), default=1)))
+        records["pair"], records["algorithm"], records["run"] = pairs, algorithms, runs
+        records["corr"][:] = correlations
+        records["measure"] = [np.mean(corr) for corr in correlations]
+        return records
+
+    def read(self, algorithm=None, latest=True):
+        """
+        Read all records
+        :param algorithm: only return records of this algorithm ("none" before mapping)
+        :param latest: only keep the last record of every (comparison, algorithm, run), e.g. of repeated comparisons
+        :return: structured array with fields pair, algorithm, run, corr (array of correlations per record, their
+        number depends on the compared spaces) and measure (mean of corr), empty if there is no store
+        """
+        if not os.path.isfile(self.path):
+            return np.zeros(0, record_dtype())
+        with open(self.path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                magic = f.read(len(MAGIC))
+                if magic and magic != MAGIC:
+                    raise ValueError("{} is not a results store".format(self.path))
+                data = np.fromfile(f, dtype=np.uint8)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        records = self._parse(data)
+
+        if algorithm is not None:
+            records = records[records["algorithm"] == algorithm]
+        if latest and len(records):
+            keys = records[["pair", "algorithm", "run"]]
+            # first occurrence in the reversed records is the last record of every key
+            _, last = np.unique(keys[::-1], return_index=True)
+            records = records[np.sort(len(records) - 1 - last)]
+        return records
+
+    def correlations(self, algorithm):
+        """
+        Dimension-wise correlations of the original spaces and CCA measures of the simulation runs per comparison
+        :param algorithm: mapping algorithm
+        :return: dict of original correlations per comparison name, dict of simulated CCA measures per name
+        """
+        records = self.read(algorithm)
+        pairs = records["pair"]
+        orig = {str(name): corr for name, corr in zip(pairs[records["run"] == 0], records["corr"][records["run"] == 0])}
+        simulations = {str(name): records["measure"][(pairs == name) & (records["run"] > 0)]
+                       for name in np.unique(pairs)}
+        return orig, simulations
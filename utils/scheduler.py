@@ -0,0 +1,36 @@
+# Process pool for pairwise comparisons of embedding spaces
+
+import logging
+import multiprocessing
+
+# registry shared with the worker processes: they are forked after all spaces have been loaded,
+# so the embedding matrices are shared copy-on-write instead of being pickled for every job
+_registry = None
+
+
+def _run_job(job):
+    func, args = job
+    return func(_registry, *args)
+
+
+def run_jobs(func, jobs, registry, processes=1):
+    """
+    Run func(registry, *args) for all argument tuples in jobs
+    :param func: module level function taking the registry as first argument
+    :param jobs: list of argument tuples
+    :param registry: EmbeddingRegistry containing all (pre-loaded) embedding spaces used by the jobs
+    :param processes: number of worker processes (jobs are run in the current process if <= 1)
+    :return: list of results in the order of jobs
+    """
+    global _registry
+    if processes <= 1 or len(jobs) <= 1:
+        return [func(registry, *args) for args in jobs]
+
+    logging.info("Running {} jobs on {} processes".format(len(jobs), processes))
+    _registry = registry
+    try:
+        # fork is needed to share the loaded spaces with the workers
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            return pool.map(_run_job, [(func, args) for args in jobs], chunksize=1)
+    finally:
+        _registry = None
@@ -0,0 +1,177 @@
+# Pairwise CCA measure for a set of embedding spaces
+
+import os
+import logging
+import numpy as np
+from tabulate import tabulate
+from utils.UniversalityTests import UniversalityTests
+from utils.embeddings import EmbeddingRegistry
+from utils.scheduler import run_jobs
+from utils.resampling import Significance
+
+
+def upper_triangle(n):
+    """
+    All index pairs (i, j) with i <= j, i.e. the upper triangle of an n x n matrix including the diagonal
+    :param n: number of rows/columns
+    :return: list of index pairs
+    """
+    return [(i, j) for i in range(n) for j in range(i, n)]
+
+
+def cca_measure(registry, src_embed, trg_embed, vocab_file, algorithm, src_mapped_embed, trg_mapped_embed,
+                cache=None, resamples=0, workers=1):
+    """
+    Map two embedding spaces and calculate the CCA measure
+    :param resamples: number of bootstrap replicates and permutations (only for gcca, none if 0)
+    :param workers: number of threads for resampling
+    :return: CCA measure (Significance if resamples > 0)
+    """
+    save_mapped = src_mapped_embed or trg_mapped_embed
+    logging.info("Comparing {} and {}".format(src_embed, trg_embed))
+    embedding_tests = UniversalityTests(src_embed, trg_embed, vocab_file, registry=registry)
+
+    if algorithm == "gcca" and not save_mapped:
+        # the CCA measure after gcca mapping is the mean of the canonical correlations
+        mapping = {} if cache is not None else None
+        corr = embedding_tests.get_canonical_correlations(mapping)
+    else:
+        # map spaces
+        embedding_tests.map_spaces(algorithm, src_mapped_embed=src_mapped_embed, trg_mapped_embed=trg_mapped_embed)
+
+        # calculate CCA measure
+        corr = embedding_tests.get_embedding_correlations()
+        mapping = embedding_tests.mapping
+
+    result = np.mean(corr)
+    arrays = {}
+    if resamples:
+        result = embedding_tests.get_significance(algorithm, n_resamples=resamples, n_permutations=resamples,
+                                                  workers=workers)
+        arrays = {"ci": np.array([result.ci_low, result.ci_high]), "p_value": result.p_value, "resamples": resamples}
+
+    if cache is not None:
+        cache.put(cache.key(src_embed, trg_embed, vocab_file, algorithm), corr=corr, **mapping,
+                  **arrays)
+    return result
+
+
+def similarity_matrix(embeddings, names, work_dir, algorithm="gcca", registry=None, processes=1, save_mapped=False,
+                      cache=None, resamples=0, workers=4):
+    """
+    Calculate the CCA measure for all combinations of the given embedding spaces.
+    Every space is loaded only once, and as the measure is symmetric,
+    only the upper triangle (including the diagonal) is computed and mirrored.
+    :param embeddings: paths to pre-trained embedding spaces
+    :param names: short names of the corpora (used for the shared vocabulary files)
+    :param work_dir: where to store the shared vocabulary files
+    :param algorithm: mapping algorithm passed to UniversalityTests.map_spaces
+    :param registry: EmbeddingRegistry to share loaded spaces with (a new one is created if None)
+    :param processes: number of worker processes the comparisons are distributed over
+    :param save_mapped: whether to transform and save the complete mapped spaces (in directory algorithm)
+    :param cache: ResultCache, pairs compared before are not recomputed
+    :param resamples: number of bootstrap replicates and permutations for the confidence intervals and p-values
+    (only for gcca, none if 0)
+    :param workers: number of resampling threads (per process)
+    :return: n x n matrix of CCA measures
+    (and n x n matrices of the lower and upper confidence bounds and of the p-values if resamples > 0)
+    """
+    if resamples and algorithm != "gcca":
+        raise ValueError("Resampling is only available for gcca")
+    if registry is None:
+        registry = EmbeddingRegistry()
+    n = len(embeddings)
+
+    pairs = upper_triangle(n)
+    # mapped spaces are stored per comparison, so that concurrent jobs do not write to the same file
+    jobs = [(embeddings[i], embeddings[j], os.path.join(work_dir, names[i] + "_" + names[j] + ".vocab.txt"),
+             algorithm, "mapped_src_{}_{}.emb".format(names[i], names[j]) if save_mapped else None,
+             "mapped_trg_{}_{}.emb".format(names[i], names[j]) if save_mapped else None, cache, resamples, workers)
+            for i, j in pairs]
+
+    scores = {}
+    if cache is not None and not save_mapped:
+        # pairs that have been compared before do not need to be loaded
+        for pair, job in zip(pairs, jobs):
+            if os.path.isfile(job[2]):
+                entry = cache.get(cache.key(job[0], job[1], job[2], algorithm))
+                if entry is None:
+                    continue
+                if not resamples:
+                    scores[pair] = np.mean(entry["corr"])
+                elif entry.get("resamples") == resamples:
+                    scores[pair] = Significance(np.mean(entry["corr"]), *entry["ci"], entry["p_value"])
+    todo = [(pair, job) for pair, job in zip(pairs, jobs) if pair not in scores]
+    logging.info("{} of {} comparisons cached".format(len(scores), len(pairs)))
+
+    if processes > 1:
+        # the worker processes share the spaces loaded before they are started
+        registry.preload(sorted({embed for _, job in todo for embed in job[:2]}))
+    for (pair, _), score in zip(todo, run_jobs(cca_measure, [job for _, job in todo], registry, processes=processes)):
+        scores[pair] = score
+
+    if resamples:
+        # measure, confidence bounds and p-value matrices
+        matrices = np.zeros((4, n, n))
+        for (i, j), score in scores.items():
+            matrices[:, i, j] = matrices[:, j, i] = score
+        return tuple(matrices)
+
+    distances = np.zeros((n, n))
+    for (i, j), score in scores.items():
+        distances[i, j] = distances[j, i] = score
+
+    logging.debug("Loaded {} embedding spaces for {} comparisons".format(len(registry), len(pairs)))
+    return distances
+
+
+def neighbour_matrix(embeddings, names, work_dir, k=10, registry=None):
+    """
+    Calculate the neighbourhood overlap for all combinations of the given embedding spaces.
+    The comparisons run in this process, so that the nearest neighbours of every space are computed only once
+    (for the union of its shared vocabularies) and reused for all comparisons with it.
+    :param embeddings: paths to pre-trained embedding spaces
+    :param names: short names of the corpora (used for the shared vocabulary files, as in similarity_matrix)
+    :param work_dir: where to store the shared vocabulary files
+    :param k: number of neighbours
+    :param registry: EmbeddingRegistry to share loaded spaces and neighbours with (a new one is created if None)
+    :return: n x n matrix of mean neighbourhood overlaps
+    """
+    if registry is None:
+        registry = EmbeddingRegistry()
+    n = len(embeddings)
+    overlaps = np.ones((n, n))
+    for i, j in upper_triangle(n):
+        if i == j:
+            continue
+        logging.info("Comparing neighbourhoods of {} and {}".format(embeddings[i], embeddings[j]))
+        embedding_tests = UniversalityTests(embeddings[i], embeddings[j],
+                                            os.path.join(work_dir, names[i] + "_" + names[j] + ".vocab.txt"),
+                                            registry=registry)
+        overlaps[i, j] = overlaps[j, i] = np.mean(embedding_tests.get_neighbour_overlap(k))
+    return overlaps
+
+
+def latex_table(matrix, headers, ci_low=None, ci_high=None, p_values=None):
+    """
+    LaTeX table of a similarity matrix
+    :param matrix: n x n matrix of CCA measures
+    :param headers: names of the compared spaces
+    :param ci_low: lower bounds of the confidence intervals (added to the cells if given)
+    :param ci_high: upper bounds of the confidence intervals
+    :param p_values: matrix of p-values (added as a second table if given)
+    :return: LaTeX code
+    """
+    if ci_low is not None:
+        # cells with confidence intervals
+        distances = [[headers[i]] + ["{:0.2f} [{:0.2f}, {:0.2f}]".format(*cell) for cell in zip(row, ci_low[i], ci_high[i])]
+                     for i, row in enumerate(matrix)]
+    else:
+        distances = [[headers[i]] + list(row) for i, row in enumerate(matrix)]
+
+    latex = tabulate(distances, headers=[''] + headers, floatfmt='0.2f',
+                     tablefmt='latex')
+    if p_values is not None:
+        latex += "\n\n" + tabulate([[headers[i]] + list(row) for i, row in enumerate(p_values)], headers=[''] + headers,
+                                    floatfmt='0.3f', tablefmt='latex')
+    return latex
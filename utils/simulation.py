@@ -0,0 +1,261 @@
+# Simulation study: compare embeddings trained on random disjoint halves of a joined corpus
+
+import os
+import glob
+import json
+import shlex
+import logging
+import threading
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from utils.UniversalityTests import UniversalityTests
+from utils.results import ResultStore, store_path, encode_names
+
+# read corpus files in blocks of 64 MB when indexing lines
+BLOCK_SIZE = 1 << 26
+
+# hyperwords PPMI+SVD settings of the simulation study
+TRAIN_CMD = "./corpus2svd.sh --thr 50 --win 5 --cds 0.75 --dim 100 --eig 0.0 {corpus} {output}"
+
+
+class LineIndex:
+    """
+    Byte offsets of all lines of one or more corpus files (i.e. of their concatenation),
+    so that random subsets of lines can be read without shuffling and copying the corpus
+    """
+    def __init__(self, paths):
+        """
+        :param paths: corpus files (one sentence per line)
+        """
+        self.paths = list(paths)
+        files, starts, ends = [], [], []
+        for i, path in enumerate(self.paths):
+            logging.debug("Indexing lines of {}".format(path))
+            newlines = []
+            offset = 0
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                    newlines.append(np.flatnonzero(np.frombuffer(block, np.uint8) == 10) + offset)
+                    offset += len(block)
+            line_ends = np.concatenate(newlines + [np.zeros(0, np.int64)]).astype(np.int64)
+            if offset and (not len(line_ends) or line_ends[-1] != offset - 1):
+                # last line without trailing newline
+                line_ends = np.append(line_ends, offset)
+            line_starts = np.concatenate([[0], line_ends[:-1] + 1]).astype(np.int64)[:len(line_ends)]
+            files.append(np.full(len(line_ends), i, np.int32))
+            starts.append(line_starts)
+            ends.append(line_ends)
+        self.files = np.concatenate(files)
+        self.starts = np.concatenate(starts)
+        # line lengths in bytes including the newline
+        self.lengths = np.concatenate(ends) - self.starts + 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sample_halves(self, rng, size):
+        """
+        Draw two disjoint random halves of the corpus by permuting the lines
+        (as head -c / tail -c of the shuffled corpus, without partial lines)
+        :param rng: numpy random Generator
+        :param size: maximum size of each half in bytes
+        :return: line ids of the first and second half
+        """
+        perm = rng.permutation(len(self))
+        first = perm[:np.searchsorted(np.cumsum(self.lengths[perm]), size, side="right")]
+        rest = perm[len(first):][::-1]
+        last = rest[:np.searchsorted(np.cumsum(self.lengths[rest]), size, side="right")]
+        return first, last[::-1]
+
+    def iter_lines(self, lines):
+        """
+        Read the given lines (in corpus order for sequential reads, the order of lines is irrelevant for training)
+        :param lines: line ids
+        :return: generator of lines (str, without newline)
+        """
+        lines = np.sort(lines)
+        for i, path in enumerate(self.paths):
+            selected = lines[self.files[lines] == i]
+            with open(path, "rb") as f:
+                for start, length in zip(self.starts[selected], self.lengths[selected]):
+                    f.seek(start)
+                    yield f.read(length).decode("utf-8").rstrip("\n")
+
+    def write_lines(self, lines, path):
+        """
+        Write the given lines to a file (e.g. as input for an external embedding trainer)
+        :param lines: line ids
+        :param path: output file
+        """
+        with open(path, "w", encoding="utf-8") as out:
+            for line in self.iter_lines(lines):
+                out.write(line + "\n")
+
+
+class ExternalTrainer:
+    """
+    Trains an embedding space from a corpus file with an external command (e.g. the hyperwords PPMI+SVD scripts)
+    """
+    def __init__(self, cmd=TRAIN_CMD, work_dir="."):
+        """
+        :param cmd: command with placeholders {corpus} and {output}, expected to create <corpus>.emb
+        (use e.g. "conda run -n embeddings2 ./corpus2svd.sh ..." for a separate python environment)
+        :param work_dir: directory the command is run in
+        """
+        self.cmd = cmd
+        self.work_dir = work_dir
+
+    def train(self, corpus, lines, out_dir, name):
+        """
+        :param corpus: LineIndex
+        :param lines: (distinct) line ids of the training corpus
+        :param out_dir: directory for the training corpus, output and log file
+        :param name: name of the training corpus
+        :return: path to the trained embedding space (<corpus>.emb, next to the corpus file that was trained on)
+        """
+        out_file = os.path.abspath(os.path.join(out_dir, name))
+        copy = len(corpus.paths) > 1 or len(lines) < len(corpus)
+        if copy:
+            corpus_file = out_file
+            corpus.write_lines(lines, corpus_file)
+        else:
+            # all lines of a single file (e.g. an original corpus) are trained on directly, as corpus_simulation.sh
+            corpus_file = os.path.abspath(corpus.paths[0])
+        cmd = self.cmd.format(corpus=shlex.quote(corpus_file), output=shlex.quote(out_file + ".out"))
+        with open(out_file + ".log", "w") as log:
+            subprocess.run(cmd, shell=True, cwd=self.work_dir, stdout=log, stderr=subprocess.STDOUT, check=True)
+        if copy:
+            # the copied corpus file is only needed for training
+            os.remove(corpus_file)
+        return corpus_file + ".emb"
+
+
+class SimulationState:
+    """
+    Finished runs of a simulation (stored as json file, so that an interrupted simulation can be resumed),
+    run 0 is the comparison of the original embeddings
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.isfile(path):
+            with open(path) as f:
+                self.done = set(json.load(f)["done"])
+        self.lock = threading.Lock()
+
+    def finish(self, run):
+        with self.lock:
+            self.done.add(run)
+            with open(self.path + ".tmp", "w") as f:
+                json.dump({"done": sorted(self.done)}, f)
+            os.replace(self.path + ".tmp", self.path)
+
+
+def correlations(src_emb, trg_emb, vocab_file, algorithm="gcca"):
+    """
+    Dimension-wise correlations of two embedding spaces after mapping them
+    :return: correlations (in descending order for gcca, as written by mapping_correlation.py)
+    """
+    embedding_tests = UniversalityTests(src_emb, trg_emb, vocab_file)
+    if algorithm == "gcca":
+        return np.flip(embedding_tests.get_canonical_correlations())
+    embedding_tests.map_spaces(algorithm)
+    return embedding_tests.get_embedding_correlations()
+
+
+def original_embeddings(corpora, embedding_dir, out_dir, trainer):
+    """
+    Train the embeddings of the original corpora if they do not exist
+    :param corpora: corpus files
+    :param embedding_dir: directory of the original embeddings (<corpus file name>.emb)
+    :param out_dir: directory for the training files
+    :param trainer: trainer (see run_simulation)
+    :return: paths to the original embeddings
+    """
+    os.makedirs(embedding_dir, exist_ok=True)
+    embeddings = []
+    for corpus_file in corpora:
+        embedding = os.path.join(embedding_dir, os.path.basename(corpus_file) + ".emb")
+        if not os.path.isfile(embedding):
+            corpus = LineIndex([corpus_file])
+            trained = trainer.train(corpus, range(len(corpus)), out_dir, os.path.basename(corpus_file))
+            # move embedding file (and arrays stored separately by gensim) to embedding dir
+            for path in [trained] + glob.glob(glob.escape(trained) + ".*"):
+                os.replace(path, embedding + path[len(trained):])
+        embeddings.append(embedding)
+    return embeddings
+
+
+def run_simulation(corpora, orig_embeddings, out_dir, trainer, runs=100, size=260 * 10**6, seed=0,
+                   train_workers=4, compare_workers=2, algorithm="gcca"):
+    """
+    Compare the original embeddings and embeddings trained on random disjoint halves of the joined corpora.
+    Training and comparison are pipelined in bounded job queues, finished runs are skipped when resuming.
+    The dimension-wise correlations of the original embeddings (run 0) and of every simulation run are appended to
+    the results store next to out_dir (see utils.results.store_path), as the comparison named after out_dir.
+    :param corpora: corpus files that are joined for the simulation
+    :param orig_embeddings: embedding spaces trained on the original corpora
+    :param out_dir: directory for all simulation files
+    :param trainer: object with train(corpus, lines, out_dir, name) returning the trained embedding path
+    (e.g. ExternalTrainer or utils.ppmi_svd.PPMISVDTrainer)
+    :param runs: number of simulations
+    :param size: size of each half in bytes
+    :param seed: random seed (each run uses its own random generator, so results do not depend on resuming)
+    :param train_workers: maximum number of concurrent trainings
+    :param compare_workers: maximum number of concurrent comparisons
+    :param algorithm: mapping algorithm
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    name = os.path.basename(os.path.abspath(out_dir))
+    store = ResultStore(store_path(out_dir))
+    # fail before training if the results can not be stored
+    encode_names(name, algorithm)
+    state = SimulationState(os.path.join(out_dir, name + ".state.json"))
+
+    # original correlations are stored as run 0
+    if 0 not in state.done:
+        store.append(name, algorithm, 0,
+                     correlations(orig_embeddings[0], orig_embeddings[1], os.path.join(out_dir, "vocab.txt"), algorithm))
+        state.finish(0)
+
+    todo = [run for run in range(1, runs + 1) if run not in state.done]
+    if not todo:
+        return
+    corpus = LineIndex(corpora)
+    logging.info("Simulating {} runs on {} lines".format(len(todo), len(corpus)))
+    if hasattr(trainer, "prepare"):
+        # e.g. tokenize the corpus once for all trainings
+        trainer.prepare(corpus)
+
+    # at most train_workers runs are in flight, so that only few training corpora exist at the same time
+    pending = threading.BoundedSemaphore(train_workers)
+
+    with ThreadPoolExecutor(train_workers) as runs_pool, ThreadPoolExecutor(train_workers) as training, \
+            ThreadPoolExecutor(compare_workers) as comparing:
+        def compare(run, emb1, emb2):
+            try:
+                store.append(name, algorithm, run,
+                             correlations(emb1, emb2, os.path.join(out_dir, "vocab.{}.txt".format(run)), algorithm))
+                state.finish(run)
+                logging.info("Finished simulation {}".format(run))
+            finally:
+                pending.release()
+
+        def simulate(run):
+            try:
+                halves = corpus.sample_halves(np.random.default_rng([seed, run]), size)
+                embeddings = list(training.map(lambda half: trainer.train(
+                    corpus, halves[half], out_dir, "corpus.{}.{}.en".format(half + 1, run)), range(2)))
+            except Exception:
+                pending.release()
+                raise
+            # the comparison runs while the next runs are being trained
+            return comparing.submit(compare, run, *embeddings)
+
+        futures = []
+        for run in todo:
+            pending.acquire()
+            futures.append(runs_pool.submit(simulate, run))
+        for future in futures:
+            future.result().result()
@@ -0,0 +1,114 @@
+# Streaming mean and covariance statistics of (concatenated) embedding views
+
+import numpy as np
+
+# number of rows processed at once
+CHUNK_SIZE = 10000
+
+
+class CovarianceAccumulator:
+    """
+    Mean and covariance of the concatenated views, updated incrementally with chunks of rows
+    (Welford's algorithm in the chunk-wise variant of Chan et al.), so that memory only depends on
+    the chunk size and new vocabulary can be added without recomputing the statistics from scratch
+    """
+    def __init__(self, dims):
+        """
+        :param dims: dimensions of the views
+        """
+        self.dims = list(dims)
+        self.n = 0
+        self.mean = np.zeros(sum(self.dims))
+        # sum of outer products of the deviations from the mean
+        self.comoment = np.zeros((sum(self.dims), sum(self.dims)))
+
+    def update(self, views):
+        """
+        Add a chunk of rows
+        :param views: list of matrices (one per view) with the same number of rows
+        :return: self
+        """
+        chunk = np.concatenate([np.asarray(view, dtype=np.float64) for view in views], axis=1)
+        if chunk.shape[0]:
+            mean = chunk.mean(axis=0)
+            centered = chunk - mean
+            self._merge(chunk.shape[0], mean, centered.T.dot(centered))
+        return self
+
+    def merge(self, other):
+        """
+        Add the statistics of another accumulator (e.g. computed on another part of the vocabulary)
+        :param other: CovarianceAccumulator
+        :return: self
+        """
+        if other.n:
+            self._merge(other.n, other.mean, other.comoment)
+        return self
+
+    def _merge(self, n, mean, comoment):
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment += comoment + np.outer(delta, delta) * (self.n * n / total)
+        self.mean += delta * (n / total)
+        self.n = total
+
+    def view_slice(self, i):
+        start = sum(self.dims[:i])
+        return slice(start, start + self.dims[i])
+
+    def cov(self, ddof=1):
+        """
+        :param ddof: delta degrees of freedom (as in np.cov)
+        :return: covariance matrix of the concatenated views
+        """
+        return self.comoment / (self.n - ddof)
+
+    def block(self, i, j, ddof=1):
+        """
+        :return: (cross-)covariance matrix of views i and j
+        """
+        return self.comoment[self.view_slice(i), self.view_slice(j)] / (self.n - ddof)
+
+    def cross_product(self, i, j):
+        """
+        :return: uncentered cross-product of views i and j (i.e. view_i.T.dot(view_j) of the complete rows)
+        """
+        return self.comoment[self.view_slice(i), self.view_slice(j)] + \
+            np.outer(self.mean[self.view_slice(i)], self.mean[self.view_slice(j)]) * self.n
+
+    def correlations(self, i=0, j=1):
+        """
+        Dimension-wise correlations between two views of the same dimension
+        :return: correlation per dimension
+        """
+        return self.mapped_correlations(None, None, i, j)
+
+    def mapped_correlations(self, a=None, b=None, i=0, j=1):
+        """
+        Dimension-wise correlations between two views after linear maps (view_i.dot(a) and view_j.dot(b)),
+        computed from the covariance blocks without transforming the views
+        :param a: map of view i (identity if None)
+        :param b: map of view j (identity if None)
+        :return: correlation per dimension
+        """
+        cross = self.comoment[self.view_slice(i), self.view_slice(j)]
+        cov_i = self.comoment[self.view_slice(i), self.view_slice(i)]
+        cov_j = self.comoment[self.view_slice(j), self.view_slice(j)]
+        if a is not None:
+            cross, cov_i = a.T.dot(cross), a.T.dot(cov_i).dot(a)
+        if b is not None:
+            cross, cov_j = cross.dot(b), b.T.dot(cov_j).dot(b)
+        return np.diag(cross) / np.sqrt(np.diag(cov_i) * np.diag(cov_j))
+
+
+def accumulate(views, chunk_size=CHUNK_SIZE):
+    """
+    Statistics of the given views, processed in chunks of rows
+    :param views: list of matrices (one per view) with the same number of rows
+    :param chunk_size: number of rows processed at once
+    :return: CovarianceAccumulator
+    """
+    stats = CovarianceAccumulator([view.shape[1] for view in views])
+    for start in range(0, views[0].shape[0], chunk_size):
+        stats.update([view[start:start + chunk_size] for view in views])
+    return stats
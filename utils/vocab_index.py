@@ -0,0 +1,83 @@
+# Integer index of embedding vocabularies for fast shared vocabulary extraction
+
+import logging
+import numpy as np
+from functools import lru_cache
+
+
+def as_words(words):
+    """
+    :param words: list or array of words
+    :return: object array of the words (not copied if it already is one)
+    """
+    if isinstance(words, np.ndarray) and words.dtype == object:
+        return words
+    array = np.empty(len(words), dtype=object)
+    array[:] = list(words)
+    return array
+
+
+class VocabIndex:
+    """
+    Vocabulary of an embedding space as sorted word array, mapping words to the row ids of the vectors.
+    The arrays hold references to the words of the model (object arrays), a fixed-width unicode array would take
+    the space of the longest word for every word
+    """
+    def __init__(self, words):
+        """
+        :param words: words in the order of the rows of the embedding matrix (e.g. model.index2word)
+        """
+        words = as_words(words)
+        self.order = np.argsort(words, kind="stable")
+        self.sorted_words = words[self.order]
+
+    def __len__(self):
+        return len(self.sorted_words)
+
+    def lookup(self, words):
+        """
+        Row ids of the given words
+        :param words: list or array of words
+        :return: array of row ids (-1 for unknown words)
+        """
+        words = as_words(words)
+        if not len(self) or not len(words):
+            return np.full(len(words), -1)
+        pos = np.minimum(np.searchsorted(self.sorted_words, words), len(self) - 1)
+        return np.where(self.sorted_words[pos] == words, self.order[pos], -1)
+
+    def intersect(self, other):
+        """
+        Shared vocabulary of two embedding spaces
+        :param other: VocabIndex
+        :return: row ids in this and in the other space of the shared words (in alphabetical order)
+        """
+        _, rows, other_rows = np.intersect1d(self.sorted_words, other.sorted_words,
+                                             assume_unique=True, return_indices=True)
+        return self.order[rows], other.order[other_rows]
+
+
+def shared_rows(indices):
+    """
+    Vocabulary shared by several embedding spaces
+    :param indices: list of VocabIndex
+    :return: shared words (in alphabetical order) and their row ids in every space (list of arrays)
+    """
+    words = indices[0].sorted_words
+    for index in indices[1:]:
+        words = np.intersect1d(words, index.sorted_words, assume_unique=True)
+    return words, [index.lookup(words) for index in indices]
+
+
+@lru_cache(maxsize=8)
+def load_dictionary(dictionary):
+    """
+    Load (and cache) the unique translation pairs of a bilingual dictionary
+    :param dictionary: dictionary file (one space separated translation pair per line)
+    :return: source and target words
+    """
+    logging.debug("Extracting translations")
+    with open(dictionary, encoding="utf-8") as d:
+        translations = dict.fromkeys(tuple(line.strip().split()[:2]) for line in d if line.strip())
+    src, trg = zip(*translations) if translations else ((), ())
+    return as_words(src), as_words(trg)
@@ -2,21 +2,21 @@
 
 """
 Visualize simulation results.
-Expects subfolders containing csv files with simulation results
-First line is original data distribution, following lines are simulation results
+Expects the results store of the comparisons in the given directory (or subfolders containing csv files
+with simulation results, first line is original data distribution, following lines are simulation results)
 Creates corr.png visualizing dimension-wise correlation among all different comparisons and
-one file per csv file visualizing the density distribution of the simulation results and the original datapoint
+one file per comparison visualizing the density distribution of the simulation results and the original datapoint
 """
 
 import os
 import sys
 import logging
 import numpy as np
-import csv
 import matplotlib as mpl
 mpl.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils.results import ResultStore, STORE_NAME
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
 
@@ -61,68 +61,83 @@ def plot_correlation(path, corr_dict):
 
     # hard coded to assure color-compatibility (uncomment desired setting)
 
-    #plt.plot(x, [float(v) for v in corr_dict["wiki-wiki"]], color="purple", linestyle='solid', label="wiki-wiki")
-    plt.plot(x, [float(v) for v in corr_dict["wiki1-wiki1"]], color="purple", linestyle='solid', label="wiki1-wiki1")
-    plt.plot(x, [float(v) for v in corr_dict["wiki1-wiki2"]], color="green", linestyle='solid', label="wiki1-wiki2")
-    plt.plot(x, [float(v) for v in corr_dict["wiki-sub"]], color="red", linestyle='solid', label="wiki-sub")
-    plt.plot(x, [float(v) for v in corr_dict["wiki-euro"]], color="blue", linestyle='solid', label="wiki-euro")
-    plt.plot(x, [float(v) for v in corr_dict["wiki-dgt"]], color="orange", linestyle='solid', label="wiki-dgt")
-    plt.plot(x, [float(v) for v in corr_dict["wiki-med"]], color="c", linestyle='solid', label="wiki-med")
-
-    # plt.plot(x, [float(v) for v in corr_dict["en-en"]], color="red", linestyle='solid', label="en-en")
-    # plt.plot(x, [float(v) for v in corr_dict["en-de"]], color="blue", linestyle='solid', label="en-de")
-    # plt.plot(x, [float(v) for v in corr_dict["en-de_en"]], color="blue", linestyle='dotted', label="en-de_en")
-    # plt.plot(x, [float(v) for v in corr_dict["en-es"]], color="green", linestyle='solid', label="en-es")
-    # plt.plot(x, [float(v) for v in corr_dict["en-cs"]], color="orange", linestyle='solid', label="en-cs")
-
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-wiki_en"]], color="purple", linestyle='solid', label="wiki_en-wiki_en")
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-wiki_de"]], color="green", linestyle='solid', label="wiki_en-wiki_de")
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-sub_de"]], color="red", linestyle='solid', label="wiki_en-sub_de")
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-euro_de"]], color="blue", linestyle='solid', label="wiki_en-euro_de")
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-dgt_de"]], color="orange", linestyle='solid', label="wiki_en-dgt_de")
-    # plt.plot(x, [float(v) for v in corr_dict["wiki_en-med_de"]], color="c", linestyle='solid', label="wiki_en-med_de")
-
-    # plt.plot(x, [float(v) for v in corr_dict["book-dvd"]], color="purple", linestyle='solid', label="book-dvd")
-    # plt.plot(x, [float(v) for v in corr_dict["book-electronics"]], color="green", linestyle='solid', label="book-electronics")
-    # plt.plot(x, [float(v) for v in corr_dict["book-kitchen"]], color="red", linestyle='solid', label="book-kitchen")
-    # plt.plot(x, [float(v) for v in corr_dict["dvd-electronics"]], color="blue", linestyle='solid', label="dvd-electronics")
-    # plt.plot(x, [float(v) for v in corr_dict["dvd-kitchen"]], color="orange", linestyle='solid', label="dvd-kitchen")
-    # plt.plot(x, [float(v) for v in corr_dict["electronics-kitchen"]], color="c", linestyle='solid', label="electronics-kitchen")
+    #plt.plot(x, corr_dict["wiki-wiki"], color="purple", linestyle='solid', label="wiki-wiki")
+    plt.plot(x, corr_dict["wiki1-wiki1"], color="purple", linestyle='solid', label="wiki1-wiki1")
+    plt.plot(x, corr_dict["wiki1-wiki2"], color="green", linestyle='solid', label="wiki1-wiki2")
+    plt.plot(x, corr_dict["wiki-sub"], color="red", linestyle='solid', label="wiki-sub")
+    plt.plot(x, corr_dict["wiki-euro"], color="blue", linestyle='solid', label="wiki-euro")
+    plt.plot(x, corr_dict["wiki-dgt"], color="orange", linestyle='solid', label="wiki-dgt")
+    plt.plot(x, corr_dict["wiki-med"], color="c", linestyle='solid', label="wiki-med")
+
+    # plt.plot(x, corr_dict["en-en"], color="red", linestyle='solid', label="en-en")
+    # plt.plot(x, corr_dict["en-de"], color="blue", linestyle='solid', label="en-de")
+    # plt.plot(x, corr_dict["en-de_en"], color="blue", linestyle='dotted', label="en-de_en")
+    # plt.plot(x, corr_dict["en-es"], color="green", linestyle='solid', label="en-es")
+    # plt.plot(x, corr_dict["en-cs"], color="orange", linestyle='solid', label="en-cs")
+
+    # plt.plot(x, corr_dict["wiki_en-wiki_en"], color="purple", linestyle='solid', label="wiki_en-wiki_en")
+    # plt.plot(x, corr_dict["wiki_en-wiki_de"], color="green", linestyle='solid', label="wiki_en-wiki_de")
+    # plt.plot(x, corr_dict["wiki_en-sub_de"], color="red", linestyle='solid', label="wiki_en-sub_de")
+    # plt.plot(x, corr_dict["wiki_en-euro_de"], color="blue", linestyle='solid', label="wiki_en-euro_de")
+    # plt.plot(x, corr_dict["wiki_en-dgt_de"], color="orange", linestyle='solid', label="wiki_en-dgt_de")
+    # plt.plot(x, corr_dict["wiki_en-med_de"], color="c", linestyle='solid', label="wiki_en-med_de")
+
+    # plt.plot(x, corr_dict["book-dvd"], color="purple", linestyle='solid', label="book-dvd")
+    # plt.plot(x, corr_dict["book-electronics"], color="green", linestyle='solid', label="book-electronics")
+    # plt.plot(x, corr_dict["book-kitchen"], color="red", linestyle='solid', label="book-kitchen")
+    # plt.plot(x, corr_dict["dvd-electronics"], color="blue", linestyle='solid', label="dvd-electronics")
+    # plt.plot(x, corr_dict["dvd-kitchen"], color="orange", linestyle='solid', label="dvd-kitchen")
+    # plt.plot(x, corr_dict["electronics-kitchen"], color="c", linestyle='solid', label="electronics-kitchen")
 
     ax.legend(loc="upper left", bbox_to_anchor=(1,1))
     fig.tight_layout()
     plt.savefig(path + "/corr.png")
 
 
-corr_dict = {}
-# expects csv files in corresponding sub folders
-# use commented version if csv files are in one folder
-parent = os.path.abspath(sys.argv[1])
-for d in os.listdir(parent):
-    dir = os.path.join(parent,d)
-    if os.path.isdir(dir):
-        for file in os.listdir(dir):
-            if file.endswith(".csv"):
-                with open(os.path.join(dir,file)) as f:
-# for file in os.listdir("."):
-#     if file.endswith(".csv"):
-#         with open(file) as f:
-                    csvReader = csv.reader(f)
-                    name = os.path.splitext(file)[0]
-                    scores = []
-                    is_first = True
-                    for row in csvReader:
-                        # first line contains original correlations
-                        if is_first:
-                            orig = np.mean([float(i) for i in row])
-                            corr_dict[name] = row
-                            print("{}: {}\n".format(name, round(orig,2)))
-                            is_first = False
-                        # next lines (if present) are simulation results
-                        else:
-                            scores.append(np.mean([float(i) for i in row]))
-                # uncomment to visualize simulation results
-                # plot_simulation(scores, orig, name)
-
-plot_correlation(parent, corr_dict)
+def read_correlations(parent, algorithm="gcca"):
+    """
+    Read the dimension-wise correlations of all comparisons (and print their CCA measure)
+    :param parent: directory containing the results store of the comparisons in its sub folders
+    (or, for results of older versions, one sub folder per comparison with its csv file)
+    :param algorithm: mapping algorithm
+    :return: dict of the original correlations per comparison name, dict of the simulated CCA measures per name
+    """
+    store = ResultStore(os.path.join(parent, STORE_NAME))
+    if os.path.isfile(store.path):
+        corr_dict, simulations = store.correlations(algorithm)
+    else:
+        corr_dict, simulations = {}, {}
+        # expects csv files in corresponding sub folders
+        # first line is original data distribution, following lines are simulation results
+        for d in os.listdir(parent):
+            dir = os.path.join(parent,d)
+            if os.path.isdir(dir):
+                for file in os.listdir(dir):
+                    if file.endswith(".csv"):
+                        rows = np.loadtxt(os.path.join(dir, file), delimiter=",", ndmin=2)
+                        name = os.path.splitext(file)[0]
+                        corr_dict[name] = rows[0]
+                        simulations[name] = rows[1:].mean(axis=1)
+    for name, corr in corr_dict.items():
+        print("{}: {}\n".format(name, round(np.mean(corr),2)))
+    return corr_dict, simulations
+
+
+def visualize(parent, simulations=False, algorithm="gcca"):
+    """
+    Create corr.png in parent (and one density plot per comparison with simulation results in the current directory)
+    :param parent: directory containing the results of the comparisons (see read_correlations)
+    :param simulations: whether to visualize the simulation results
+    :param algorithm: mapping algorithm
+    """
+    corr_dict, scores = read_correlations(parent, algorithm)
+    if simulations:
+        for name, simulated in scores.items():
+            if len(simulated) and name in corr_dict:
+                plot_simulation(simulated, np.mean(corr_dict[name]), name)
+    plot_correlation(parent, corr_dict)
+
 
+if __name__ == "__main__":
+    # uncomment to visualize simulation results
+    visualize(os.path.abspath(sys.argv[1]))  # , simulations=True)
@@ -2,7 +2,8 @@
 
 """
 Visualize cross-lingual simulation results across domains.
-Expects sub folders containing domain folders with dimension wise correlations in one line in a csv file
+Expects sub folders containing the results store of the domain comparisons
+(or domain folders with dimension wise correlations in one line in a csv file)
 Creates cross_ling.png visualizing the similarities between languages across domains in a bar plot
 """
 
@@ -11,8 +12,8 @@ import logging
 from collections import defaultdict
 
 import numpy as np
-import csv
 import matplotlib.pyplot as plt
+from utils.results import ResultStore, STORE_NAME
 
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.INFO)
 
@@ -20,19 +21,25 @@ scores_dict = defaultdict(lambda: defaultdict(float))
 for lang in ["en-en", "en-de", "en-es", "en-cs"]:
     wiki_path = os.path.abspath(os.path.join(lang, "wiki/gcca"))
     if os.path.isdir(wiki_path):
-        for sub_dir in os.listdir(wiki_path):
-            sub_path = os.path.join(wiki_path,sub_dir)
-            if os.path.isdir(sub_path):
-                for file in os.listdir(sub_path):
-                    if file.endswith(".csv"):
-                        with open(os.path.join(sub_path, file)) as f:
-                            csvReader = csv.reader(f)
-                            name = os.path.splitext(file)[0]
-                            for row in csvReader:
-                                orig = np.mean(row)
-                                scores_dict[lang][name] = orig
-                                print("{}: {}: {}\n".format(lang, name, round(orig,2)))
-                                break
+        store = ResultStore(os.path.join(wiki_path, STORE_NAME))
+        if os.path.isfile(store.path):
+            # original correlations (run 0) of all domains
+            records = store.read("gcca")
+            records = records[records["run"] == 0]
+            measures = dict(zip(records["pair"], records["measure"]))
+        else:
+            # results of older versions: first line of the csv file in every domain folder
+            measures = {}
+            for sub_dir in os.listdir(wiki_path):
+                sub_path = os.path.join(wiki_path,sub_dir)
+                if os.path.isdir(sub_path):
+                    for file in os.listdir(sub_path):
+                        if file.endswith(".csv"):
+                            rows = np.loadtxt(os.path.join(sub_path, file), delimiter=",", ndmin=2)
+                            measures[os.path.splitext(file)[0]] = rows[0].mean()
+        for name, orig in measures.items():
+            scores_dict[lang][name] = orig
+            print("{}: {}: {}\n".format(lang, name, round(orig,2)))
 
 # data to plot
 n_groups = 5